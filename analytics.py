@@ -0,0 +1,130 @@
+from classes import CatalogueListener
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GROUP_FIELDS = ["category", "medium", "audience"]
+
+def _empty_totals():
+    return {"titles": 0, "units": 0, "inventory_value": 0.0, "potential_revenue": 0.0, "units_sold": 0, "units_received": 0}
+
+def _with_key_figures(totals):
+    '''
+    Adds the figures that are calculated from the running totals: the margin on the current stock, the margin as a percentage of the potential revenue, and the sell-through rate, i.e. the share of the units that have been sold.
+    '''
+    
+    figures = dict(totals)
+    figures["inventory_value"] = round(totals["inventory_value"], 2)
+    figures["potential_revenue"] = round(totals["potential_revenue"], 2)
+    figures["margin"] = round(totals["potential_revenue"] - totals["inventory_value"], 2)
+    figures["margin_percent"] = round(100 * figures["margin"] / totals["potential_revenue"], 2) if totals["potential_revenue"] else 0.0
+    units_handled = totals["units_sold"] + totals["units"]
+    figures["sell_through_percent"] = round(100 * totals["units_sold"] / units_handled, 2) if units_handled else 0.0
+    return figures
+
+class InventoryAnalytics(CatalogueListener):
+    '''
+    This class calculates key figures for the stock in a catalogue: the inventory value (purchase price times stock), the potential revenue (selling price times stock), the margin and the sell-through rate, both in total and grouped by category, medium or audience.
+    
+    The totals are calculated once when the class is created and are then kept up to date as books are added, updated and deleted and as the stock changes, so reading them never requires going through the catalogue. Units sold and received are counted from the stock changes made while the class is listening.
+    
+    For a `ColumnarCatalogue`, `recompute` calculates the totals with vectorized NumPy operations directly on the catalogue's columns, if NumPy is installed.
+    '''
+    
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self._totals = _empty_totals()
+        self._groups = {field: {} for field in GROUP_FIELDS}
+        # The listener is added under the same lock as the totals are calculated, so no change can be made in between and be missed.
+        with catalogue._lock:
+            self.recompute()
+            catalogue.add_listener(self)
+    
+    def close(self):
+        self.catalogue.remove_listener(self)
+    
+    def recompute(self):
+        '''
+        Calculates the stock-based totals from scratch, e.g. to remove rounding drift after a very long run. The counts of units sold and received are kept.
+        '''
+        
+        with self.catalogue._lock:
+            self._reset_stock_totals()
+            if np is not None and hasattr(self.catalogue, "numpy_column"):
+                self._recompute_vectorized()
+            else:
+                for book in self.catalogue.books:
+                    self._add_contribution(self._book_values(book), 1)
+    
+    def _reset_stock_totals(self):
+        for totals in [self._totals] + [group_totals for groups in self._groups.values() for group_totals in groups.values()]:
+            totals.update(titles=0, units=0, inventory_value=0.0, potential_revenue=0.0)
+    
+    def _recompute_vectorized(self):
+        live = np.frombuffer(self.catalogue.live_rows(), dtype=np.uint8).astype(bool)
+        stock = self.catalogue.numpy_column("stock")[live]
+        inventory_value = self.catalogue.numpy_column("purchase_price")[live] * stock
+        potential_revenue = self.catalogue.numpy_column("selling_price")[live] * stock
+        self._totals.update(titles=int(live.sum()), units=int(stock.sum()), inventory_value=float(inventory_value.sum()), potential_revenue=float(potential_revenue.sum()))
+        
+        for field in GROUP_FIELDS:
+            codes = self.catalogue.numpy_column(field)[live]
+            values = self.catalogue.code_values(field)
+            titles = np.bincount(codes, minlength=len(values))
+            units = np.bincount(codes, weights=stock, minlength=len(values))
+            values_by_code = np.bincount(codes, weights=inventory_value, minlength=len(values))
+            revenue_by_code = np.bincount(codes, weights=potential_revenue, minlength=len(values))
+            for code, value in enumerate(values):
+                if titles[code]:
+                    group_totals = self._groups[field].setdefault(value, _empty_totals())
+                    group_totals.update(titles=int(titles[code]), units=int(units[code]), inventory_value=float(values_by_code[code]), potential_revenue=float(revenue_by_code[code]))
+    
+    @staticmethod
+    def _book_values(book):
+        return {field: getattr(book, field) for field in GROUP_FIELDS + ["stock", "purchase_price", "selling_price"]}
+    
+    def _group_totals(self, values):
+        return [self._totals] + [self._groups[field].setdefault(values[field], _empty_totals()) for field in GROUP_FIELDS]
+    
+    def _add_contribution(self, values, sign):
+        for totals in self._group_totals(values):
+            totals["titles"] += sign
+            totals["units"] += sign * values["stock"]
+            totals["inventory_value"] += sign * values["purchase_price"] * values["stock"]
+            totals["potential_revenue"] += sign * values["selling_price"] * values["stock"]
+    
+    def book_added(self, book):
+        self._add_contribution(self._book_values(book), 1)
+    
+    def book_deleted(self, book):
+        self._add_contribution(self._book_values(book), -1)
+    
+    def book_updated(self, book, old_values):
+        new_values = self._book_values(book)
+        self._add_contribution({**new_values, **{field: value for field, value in old_values.items() if field in new_values}}, -1)
+        self._add_contribution(new_values, 1)
+    
+    def stock_updated(self, book, stock_change):
+        values = self._book_values(book)
+        for totals in self._group_totals(values):
+            totals["units"] += stock_change
+            totals["inventory_value"] += values["purchase_price"] * stock_change
+            totals["potential_revenue"] += values["selling_price"] * stock_change
+            if stock_change < 0:
+                totals["units_sold"] -= stock_change
+            else:
+                totals["units_received"] += stock_change
+    
+    def totals(self):
+        return _with_key_figures(self._totals)
+    
+    def summary(self, group_by):
+        '''
+        Returns a tuple of a validation error (or None) and a dictionary with the key figures for each value of the field `group_by`, which must be category, medium or audience.
+        '''
+        
+        if group_by not in self._groups:
+            return f"Invalid grouping: {group_by}. Please provide one of the following groupings: {', '.join(GROUP_FIELDS)}.", {}
+        return None, {value: _with_key_figures(totals) for value, totals in self._groups[group_by].items() if totals["titles"] or totals["units_sold"]}
@@ -0,0 +1,71 @@
+import argparse
+import csv
+import random
+
+from classes import Book
+
+FIRST_NAMES = ["Alice", "Bob", "Clara", "David", "Emma", "Frederik", "Grace", "Henrik", "Ida", "Jonas", "Karen", "Lars", "Maja", "Niels", "Olivia", "Peter", "Sofie", "Thomas", "Ulla", "Victor"]
+LAST_NAMES = ["Johnson", "Hansen", "Nielsen", "Jensen", "Pedersen", "Andersen", "Christensen", "Larsen", "Sørensen", "Rasmussen", "Williams", "Brown", "Taylor", "Smith", "Miller", "Davis", "Wilson", "Moore", "Clark", "Lewis"]
+WORDS = ["adventure", "garden", "secret", "wonder", "journey", "night", "river", "kingdom", "shadow", "light", "history", "science", "friendship", "mystery", "ocean", "mountain", "city", "dream", "war", "peace", "love", "time", "stars", "forest", "winter", "summer", "island", "voice", "memory", "future"]
+MEDIUMS = ["Printed", "E-book", "Audiobook"]
+MEDIUM_WEIGHTS = [60, 25, 15]
+CATEGORIES = ["Fiction", "Non-fiction"]
+CATEGORY_WEIGHTS = [65, 35]
+AUDIENCES = ["Children", "Young adults", "Adults"]
+AUDIENCE_WEIGHTS = [20, 15, 65]
+SIZE_RANGES = {"Printed": (80, 900), "E-book": (200, 5000), "Audiobook": (60, 1800)}
+
+def generate_rows(row_count, seed=42, duplicate_rate=0.02):
+    '''
+    Generates rows in the format of `books_data.csv`. The data is the same every time for the same seed. Medium, category and audience are skewed like a real bookstore's stock, popular authors write many books, and a share of the rows (`duplicate_rate`) repeat the title, author and medium of an earlier row, so the duplicate check is exercised.
+    '''
+    
+    generator = random.Random(seed)
+    authors = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    author_weights = [1 / rank for rank in range(1, len(authors) + 1)]
+    recent_keys = []
+    
+    for row_number in range(row_count):
+        if recent_keys and generator.random() < duplicate_rate:
+            title, author, medium = generator.choice(recent_keys)
+        else:
+            title = f"The {generator.choice(WORDS).capitalize()} of {generator.choice(WORDS).capitalize()} {row_number}"
+            author = generator.choices(authors, author_weights)[0]
+            medium = generator.choices(MEDIUMS, MEDIUM_WEIGHTS)[0]
+            if len(recent_keys) < 10000:
+                recent_keys.append((title, author, medium))
+            else:
+                recent_keys[generator.randrange(len(recent_keys))] = (title, author, medium)
+        
+        purchase_price = round(generator.uniform(2, 30), 2)
+        yield {
+            "title": title,
+            "author": author,
+            "description": " ".join(generator.choices(WORDS, k=generator.randint(15, 45))).capitalize() + ".",
+            "category": generator.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            "medium": medium,
+            "audience": generator.choices(AUDIENCES, AUDIENCE_WEIGHTS)[0],
+            "size": generator.randint(*SIZE_RANGES[medium]),
+            "purchase_price": purchase_price,
+            "selling_price": round(purchase_price * generator.uniform(1.2, 2.2), 2),
+            "stock": int(generator.paretovariate(1.5) * 3) - 3
+        }
+
+def write_csv(filepath, row_count, seed=42, duplicate_rate=0.02):
+    with open(filepath, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=Book.FIELDS)
+        writer.writeheader()
+        for row in generate_rows(row_count, seed, duplicate_rate):
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalogue in the format of books_data.csv.")
+    parser.add_argument("rows", type=int, help="The number of rows to generate, e.g. 10000, 1000000 or 10000000.")
+    parser.add_argument("output", help="The CSV file to write.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    arguments = parser.parse_args()
+    write_csv(arguments.output, arguments.rows, arguments.seed, arguments.duplicate_rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.generate_data import write_csv
+from classes import Catalogue, Factory
+from columnar import ColumnarCatalogue
+from main import generate_books_from_csv
+
+QUERY_TYPES = ["book_id", "title", "author", "category", "medium", "audience"]
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+def _result(operations, seconds, latencies_ns=None):
+    result = {"operations": operations, "seconds": round(seconds, 6), "operations_per_second": round(operations / seconds, 2) if seconds else None}
+    if latencies_ns:
+        latencies_ns.sort()
+        result["latency_ms"] = {f"p{percent}": round(_percentile(latencies_ns, percent) / 1e6, 6) for percent in (50, 90, 99)}
+        result["latency_ms"]["max"] = round(latencies_ns[-1] / 1e6, 6)
+    return result
+
+def _timed_calls(function, arguments):
+    '''
+    Calls `function` once for every item in `arguments` and returns the total time and the latency of each call in nanoseconds.
+    '''
+    
+    latencies_ns = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for argument in arguments:
+        call_start = clock()
+        function(*argument)
+        latencies_ns.append(clock() - call_start)
+    return (clock() - start) / 1e9, latencies_ns
+
+def _load_catalogue(filepath, catalogue_class=Catalogue):
+    catalogue = catalogue_class()
+    factory = Factory(catalogue)
+    generate_books_from_csv(factory, filepath, sync_state_path=None)
+    return catalogue, factory
+
+def benchmark_generate_books_from_csv(filepath, row_count, sample_size):
+    catalogue = Catalogue()
+    factory = Factory(catalogue)
+    start = time.perf_counter()
+    generate_books_from_csv(factory, filepath, sync_state_path=None)
+    return _result(row_count, time.perf_counter() - start)
+
+def benchmark_generate_book_from_data(filepath, row_count, sample_size):
+    with open(filepath, newline="") as file:
+        rows = [row for row, _ in zip(csv.DictReader(file), range(sample_size))]
+    factory = Factory(Catalogue())
+    seconds, latencies_ns = _timed_calls(factory.generate_book_from_data, [(row,) for row in rows])
+    return _result(len(rows), seconds, latencies_ns)
+
+def benchmark_add_book(filepath, row_count, sample_size):
+    # The sample is deleted from the loaded catalogue and added back, so every book is added to a catalogue and indexes of the full size.
+    catalogue, _ = _load_catalogue(filepath)
+    books = catalogue.books
+    books = random.Random(3).sample(books, min(sample_size, len(books)))
+    catalogue.delete_books([book.book_id for book in books])
+    seconds, latencies_ns = _timed_calls(catalogue.add_book, [(book,) for book in books])
+    return _result(len(books), seconds, latencies_ns)
+
+def benchmark_search_book(filepath, row_count, sample_size):
+    catalogue, _ = _load_catalogue(filepath)
+    generator = random.Random(1)
+    books = catalogue.books
+    results = {}
+    for query_type in QUERY_TYPES:
+        queries = [(query_type, getattr(generator.choice(books), query_type)) for _ in range(sample_size)]
+        seconds, latencies_ns = _timed_calls(catalogue.search_book, queries)
+        results[query_type] = _result(len(queries), seconds, latencies_ns)
+    return results
+
+def benchmark_delete_book(filepath, row_count, sample_size):
+    catalogue, _ = _load_catalogue(filepath)
+    book_ids = [book.book_id for book in catalogue.books]
+    random.Random(2).shuffle(book_ids)
+    seconds, latencies_ns = _timed_calls(catalogue.delete_book, [(book_id,) for book_id in book_ids[:sample_size]])
+    return _result(min(sample_size, len(book_ids)), seconds, latencies_ns)
+
+def benchmark_generate_stock_lists(filepath, row_count, sample_size):
+    catalogue, _ = _load_catalogue(filepath)
+    results = {}
+    for sorting_choice in Catalogue.SORTING_KEYS:
+        start = time.perf_counter()
+        catalogue.generate_stock_lists(sorting_choice, limit=sample_size)
+        first_call = time.perf_counter() - start
+        start = time.perf_counter()
+        catalogue.write_stock_list(sorting_choice, io.StringIO())
+        full_report = time.perf_counter() - start
+        results[sorting_choice] = {"first_page_seconds": round(first_call, 6), "full_report_seconds": round(full_report, 6), "books": len(catalogue.books)}
+    return results
+
+def benchmark_catalogue_memory(filepath, row_count, sample_size):
+    '''
+    Measures the memory a loaded catalogue keeps for each storage backend, both right after loading and after the first keyword search has built the full-text index.
+    '''
+    
+    # The benchmark can run under the tracing started by `run_benchmarks`, so it only stops the tracing it started itself.
+    already_tracing = tracemalloc.is_tracing()
+    results = {}
+    for catalogue_class in (Catalogue, ColumnarCatalogue):
+        if not already_tracing:
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        catalogue, _ = _load_catalogue(filepath, catalogue_class)
+        loaded = tracemalloc.get_traced_memory()[0] - baseline
+        catalogue.find_books_by_keywords("book")
+        searched = tracemalloc.get_traced_memory()[0] - baseline
+        if not already_tracing:
+            tracemalloc.stop()
+        book_count = len(catalogue.books)
+        results[catalogue_class.__name__] = {"books": book_count, "loaded_mb": round(loaded / 2 ** 20, 2), "bytes_per_book": round(loaded / book_count) if book_count else None, "with_text_index_mb": round(searched / 2 ** 20, 2)}
+        del catalogue
+    return results
+
+BENCHMARKS = {
+    "generate_books_from_csv": benchmark_generate_books_from_csv,
+    "generate_book_from_data": benchmark_generate_book_from_data,
+    "add_book": benchmark_add_book,
+    "search_book": benchmark_search_book,
+    "delete_book": benchmark_delete_book,
+    "generate_stock_lists": benchmark_generate_stock_lists,
+    "catalogue_memory": benchmark_catalogue_memory
+}
+
+def run_benchmarks(filepath, row_count, sample_size, selected_benchmarks, measure_memory):
+    '''
+    Runs the selected benchmarks on the data file and returns their results. If `measure_memory` is set, every benchmark is run a second time under `tracemalloc` to find its peak memory use, so the tracing does not affect the timings.
+    '''
+    
+    results = {}
+    for name in selected_benchmarks:
+        results[name] = BENCHMARKS[name](filepath, row_count, sample_size)
+        if measure_memory:
+            tracemalloc.start()
+            BENCHMARKS[name](filepath, row_count, sample_size)
+            results[name]["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            tracemalloc.stop()
+        print(f"{name}: done")
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(old_results, new_results):
+    '''
+    Prints the change in throughput for every benchmark that reports operations per second in both result files.
+    '''
+    
+    def throughputs(benchmarks, prefix=""):
+        for name, result in benchmarks.items():
+            if "operations_per_second" in result:
+                yield prefix + name, result["operations_per_second"]
+            elif isinstance(result, dict):
+                yield from throughputs({key: value for key, value in result.items() if isinstance(value, dict)}, f"{prefix}{name}.")
+    
+    old_throughputs = dict(throughputs(old_results["benchmarks"]))
+    for name, throughput in throughputs(new_results["benchmarks"]):
+        if old_throughputs.get(name) and throughput:
+            print(f"{name}: {old_throughputs[name]:.0f} -> {throughput:.0f} operations/second ({100 * (throughput / old_throughputs[name] - 1):+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bookstore management system on synthetic data.")
+    parser.add_argument("--rows", type=int, default=10000, help="The size of the synthetic catalogue, e.g. 10000, 1000000 or 10000000.")
+    parser.add_argument("--data", help="An existing CSV file to use instead of generating one.")
+    parser.add_argument("--samples", type=int, default=1000, help="The number of calls measured for each per-call benchmark.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--memory", action="store_true", help="Also measure the peak memory use of every benchmark.")
+    parser.add_argument("--output", default="benchmark_results.json", help="The JSON file the results are written to.")
+    parser.add_argument("--compare", help="A previous results file to compare the throughput with.")
+    arguments = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = arguments.data
+        if filepath is None:
+            filepath = os.path.join(directory, f"books_{arguments.rows}.csv")
+            write_csv(filepath, arguments.rows)
+        with open(filepath, newline="") as file:
+            row_count = sum(1 for _ in csv.DictReader(file))
+        
+        results = {
+            "revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": row_count,
+            "samples": arguments.samples,
+            "benchmarks": run_benchmarks(filepath, row_count, arguments.samples, arguments.benchmarks, arguments.memory)
+        }
+    
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {arguments.output}.")
+    
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            compare_results(json.load(file), results)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,11 @@
+import math
+import sys
+from bisect import bisect_left
+from heapq import nsmallest
+from itertools import islice
+from threading import RLock
+from text_search import InvertedIndex
+
 class Book:
     '''
     This is a parent class, that is used to create all shared attributes and methods on the book objects. The class is not itself used to directly create objects/instances; instead, child classes extend this parent class to create specialized types of books based on the medium.
@@ -5,18 +13,33 @@ class Book:
     Polymorphism is demonstrated through the `show_book_size` method, which is overridden in the child classes (`PrintedBook`, `AudioBook`, `EBook`) to provide specific implementations based on the medium of the book.
     '''
     
+    FIELDS = ["title", "author", "description", "category", "medium", "audience", "size", "purchase_price", "selling_price", "stock"]
+    
     def __init__(self, book_id, **kwargs):
         self.book_id = book_id
         self.title = kwargs["title"]
-        self.author = kwargs["author"]
+        # Author names and the fields with a fixed set of values repeat across many books, so every book shares one string object for each value.
+        self.author = sys.intern(kwargs["author"])
         self.description = kwargs["description"]
-        self.category = kwargs["category"]
-        self.medium = kwargs["medium"]
-        self.audience = kwargs["audience"]
+        self.category = sys.intern(kwargs["category"])
+        self.medium = sys.intern(kwargs["medium"])
+        self.audience = sys.intern(kwargs["audience"])
         self.size = kwargs["size"]
         self.purchase_price = kwargs["purchase_price"]
         self.selling_price = kwargs["selling_price"]
         self.stock = kwargs["stock"]
+        self._catalogue = None
+    
+    @property
+    def description(self):
+        # A description moved to the catalogue's description store is kept as its location in the store and only read when it is used.
+        if type(self._description) is int:
+            return self._catalogue._description_store.read(self._description)
+        return self._description
+    
+    @description.setter
+    def description(self, value):
+        self._description = value
     
     def __str__(self):
         return f"\nId: {self.book_id}\nTitle: {self.title}\nAuthor(s): {self.author}\nCategory: {self.category}\nMedium: {self.medium}\nStock: {self.stock}"
@@ -34,16 +57,31 @@ class Book:
         return f"Current stock for the book {self.title}: {self.stock}"
     
     def update_stock(self, stock_change):
+        # A book in a catalogue updates its stock through the catalogue, so the stock-sorted views stay correct.
+        if self._catalogue is not None:
+            return self._catalogue.update_stock(self.book_id, stock_change)
         self.stock += stock_change
+    
+    def __getstate__(self):
+        # A copy of a book sent to another process, e.g. a shard of a `ShardedCatalogue`, is not part of a catalogue there.
+        state = dict(self.__dict__)
+        state["_description"] = self.description
+        state["_catalogue"] = None
+        return state
 
 class PrintedBook(Book):
     '''
     This class is responsible for creating instances of printed books. Therefore, the show_book_size method will display the book_size as the number of pages in the printed book. All other attributes and methods are inherited from the Book parent class.
     '''
-    def __init__(self, book_id, **kwargs):
-        super().__init__(book_id, **kwargs)
-        self.title = kwargs["title"]
-        self.num_pages = kwargs["size"]
+    
+    # The number of pages is stored as the book's size, so the two cannot disagree after `Catalogue.update_book` changes the size.
+    @property
+    def num_pages(self):
+        return self.size
+    
+    @num_pages.setter
+    def num_pages(self, value):
+        self.size = value
     
     def show_book_size(self):
         return f"The printed book '{self.title}' has {self.num_pages} pages."
@@ -53,10 +91,14 @@ class EBook(Book):
     This class is responsible for creating instances of e-books. Therefore, the show_book_size method will display the book_size as the digital byte size of the e-book file. All other attributes and methods are inherited from the Book parent class.
     '''
     
-    def __init__(self, book_id, **kwargs):
-        super().__init__(book_id, **kwargs)
-        self.title = kwargs["title"]
-        self.byte_size = kwargs["size"]
+    # The byte size is read from and written to `size`, like the number of pages of a printed book.
+    @property
+    def byte_size(self):
+        return self.size
+    
+    @byte_size.setter
+    def byte_size(self, value):
+        self.size = value
     
     def show_book_size(self):
         return f"The e-book '{self.title}' has a size of {self.byte_size} KB."
@@ -66,179 +108,879 @@ class Audiobook(Book):
     This class is responsible for creating instances of audiobooks. Therefore, the show_book_size method will display the book_size as the length in minutes of the audiobook. All other attributes and methods are inherited from the Book parent class.
     '''
     
-    def __init__(self, book_id, **kwargs):
-        super().__init__(book_id, **kwargs)
-        self.title = kwargs["title"]
-        self.length_minutes = kwargs["size"]
-        
+    # The length in minutes is another name for `size`.
+    @property
+    def length_minutes(self):
+        return self.size
+    
+    @length_minutes.setter
+    def length_minutes(self, value):
+        self.size = value
+    
     def show_book_size(self):
         return f"The audiobook '{self.title}' has a length of {self.length_minutes} minutes."
 
+def _convert_count(value):
+    count = int(value)
+    if count < 0:
+        raise ValueError(f"{value} is negative")
+    return count
+
+def _convert_price(value):
+    price = float(value)
+    if not math.isfinite(price):
+        raise ValueError(f"{value} is not a finite number")
+    return round(price, 2)
+
+class FactoryListener:
+    '''
+    This class is the base class for objects that want to be told about data rejected by a `Factory`, e.g. to count failed validations and rejected duplicates. A listener is registered with `add_listener` on the factory it wants to hear from and only needs to override the methods for the events it cares about.
+    '''
+    
+    def validation_failed(self, bad_rows):
+        pass
+    
+    def duplicates_rejected(self, messages):
+        pass
+
 class Factory:
     '''
     This class is responsible for creating new books. Thus, it can receive and validate data, generate unique book ID's, create instaces of the three child classes above, and add new books to the catalogue.
     '''
     
+    BOOK_CLASSES = {"printed": PrintedBook, "audiobook": Audiobook, "e-book": EBook}
+    
+    # The allowed values of the fields with a fixed set of values, looked up by their lowercase form, and the error message for any other value.
+    ENUM_FIELDS = {
+        "category": ({"fiction": "Fiction", "non-fiction": "Non-fiction"}, "Invalid category value. Category must be 'fiction' or 'non-fiction'."),
+        "medium": ({"printed": "Printed", "audiobook": "Audiobook", "e-book": "E-book"}, "Invalid medium value. Medium must be 'printed', 'audiobook' or 'e-book'."),
+        "audience": ({"children": "Children", "young adults": "Young adults", "adults": "Adults"}, "Invalid audience value. Audience must be 'children', 'young adults' or 'adults'.")
+    }
+    # The converters of the numeric fields. Sizes and stock cannot be negative, and prices must be finite, since nan and infinity cannot be sorted or added up.
+    NUMERIC_FIELDS = {"size": _convert_count, "purchase_price": _convert_price, "selling_price": _convert_price, "stock": _convert_count}
+    
     def __init__(self, catalogue):
         self.catalogue = catalogue
         self.next_book_id = 1
+        self.listeners = []
+    
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+    
+    def report_bad_rows(self, bad_rows):
+        '''
+        Tells the listeners about rows that failed validation. `validate_books_data` reports the rows it rejects itself when it is given the factory; this method is for rows rejected elsewhere, e.g. a data file row with the wrong number of fields, or rows validated in another process.
+        '''
+        
+        if bad_rows:
+            for listener in self.listeners:
+                listener.validation_failed(bad_rows)
+    
+    def report_duplicates(self, messages):
+        '''
+        Tells the listeners about books that were rejected as duplicates before they reached the catalogue, with the rejection messages.
+        '''
+        
+        if messages:
+            for listener in self.listeners:
+                listener.duplicates_rejected(messages)
     
     def _generate_unique_id(self):
         book_id = self.next_book_id
         self.next_book_id += 1
         return book_id
     
-    def generate_book_from_data(self, row):     
-        common_args = {
-            "title": row["title"],
-            "author": row["author"],
-            "description": row["description"],
-            "category": row["category"],
-            "medium": row["medium"],
-            "audience": row["audience"],
-            "size": row["size"],
-            "purchase_price": round(float(row["purchase_price"]), 2),
-            "selling_price": round(float(row["selling_price"]), 2),
-            "stock": int(row["stock"])
-        }
-        self.create_new_book(**common_args)
+    def allocate_id_block(self, size):
+        '''
+        Reserves `size` consecutive book IDs and returns them as a range. The IDs in a block are never handed out again, so the books of a batch can be numbered in one step, and a `ShardedCatalogue` can route a whole run of IDs to the same shard.
+        '''
+        
+        block = range(self.next_book_id, self.next_book_id + size)
+        self.next_book_id += size
+        return block
+    
+    def generate_book_from_data(self, row):
+        valid_books, bad_rows = self.validate_books_data([row], factory=self)
+        if bad_rows:
+            return bad_rows[0][1]
+        return self.create_new_book(**valid_books[0])
+    
+    def _build_book(self, **kwargs):
+        book_class = self.BOOK_CLASSES.get(kwargs["medium"].lower())
+        if book_class is None:
+            return None
+        return book_class(self._generate_unique_id(), **kwargs)
     
     def create_new_book(self, **kwargs):
-        medium = kwargs["medium"].lower()
-        book_id = self._generate_unique_id()
-        if medium == "printed":
-            self.catalogue.add_book(PrintedBook(book_id, **kwargs))
-        elif medium == "audiobook":
-            self.catalogue.add_book(Audiobook(book_id, **kwargs))
-        elif medium == "e-book":
-            self.catalogue.add_book(EBook(book_id, **kwargs))
+        # Duplicates are rejected before an ID is generated, so they do not use up IDs.
+        if self.catalogue.has_book(kwargs["title"], kwargs["author"], kwargs["medium"]):
+            message = f"The book {kwargs['title']} by {kwargs['author']} already exists in the catalogue."
+            self.report_duplicates([message])
+            return message
+        new_book = self._build_book(**kwargs)
+        if new_book is None:
+            return f"Invalid medium value. Medium must be 'printed', 'audiobook' or 'e-book'."
+        return self.catalogue.add_book(new_book)
+    
+    def create_new_books(self, books_data):
+        '''
+        Creates a batch of books from already converted data, e.g. a chunk of rows from a bulk import, and adds them to the catalogue in one call. The IDs for the batch are reserved as one block, after invalid books and duplicates have been rejected, so rejected books do not use up IDs. Returns the list of messages for books that were rejected.
+        '''
         
-    def _validate_book_data(self, **kwargs):
-        for key, value in kwargs.items():
-            kwargs[key] = str(value).strip()
+        valid_books_data = []
+        rejected_books = []
+        duplicates = []
+        batch_keys = set()
+        for data in books_data:
+            key = self.catalogue._unique_key(data["title"], data["author"], data["medium"])
+            if data["medium"].lower() not in self.BOOK_CLASSES:
+                rejected_books.append(f"Invalid medium value for the book {data['title']}. Medium must be 'printed', 'audiobook' or 'e-book'.")
+            elif key in batch_keys or self.catalogue.has_book(data["title"], data["author"], data["medium"]):
+                duplicates.append(f"The book {data['title']} by {data['author']} already exists in the catalogue.")
+                rejected_books.append(duplicates[-1])
+            else:
+                batch_keys.add(key)
+                valid_books_data.append(data)
+        self.report_duplicates(duplicates)
         
-        required_fields = ["title", "author", "description", "category", "medium", "audience", "size", "purchase_price", "selling_price", "stock"]
-        for field in required_fields:
-            if field not in kwargs or not kwargs[field]:
-                return f"Missing or empty required field: {field}", None
+        book_ids = self.allocate_id_block(len(valid_books_data))
+        new_books = [self.BOOK_CLASSES[data["medium"].lower()](book_id, **data) for book_id, data in zip(book_ids, valid_books_data)]
+        rejected_books.extend(self.catalogue.add_books(new_books))
+        return rejected_books
+    
+    @classmethod
+    def validate_books_data(cls, books_data, row_numbers=None, factory=None):
+        '''
+        Validates and converts a batch of raw book data, e.g. the records of a supplier feed or a chunk of rows from a data file. The batch is processed one field at a time, so the conversion and checks for a field run as one loop over that whole column, and every error in a row is reported instead of only the first one.
         
-        try:
-            kwargs["title"] = str(kwargs["title"])
-            kwargs["author"] = str(kwargs["author"])
-            kwargs["description"] = str(kwargs["description"])
-            kwargs["category"] = str(kwargs["category"]).capitalize()
-            kwargs["medium"] = str(kwargs["medium"]).capitalize()
-            kwargs["audience"] = str(kwargs["audience"]).capitalize()
-            kwargs["size"] = int(kwargs["size"])
-            kwargs["purchase_price"] = round(float(kwargs["purchase_price"]),)
-            kwargs["selling_price"] = round(float(kwargs["selling_price"]),)
-            kwargs["stock"] = int(kwargs["stock"])
-        except ValueError as e:
-            return f"Error converting data: {str(e)}", None
-        
-        if kwargs["category"] not in ["Fiction", "Non-fiction"]:
-            return f"Invalid category value. Category must be 'fiction' or 'non-fiction'.", None
-        
-        if kwargs["medium"] not in ["Printed", "Audiobook", "E-book"]:
-            return f"Invalid medium value. Medium must be 'printed', 'audiobook' or 'e-book'.", None
-        
-        if kwargs["audience"] not in ["Children", "Young adults", "Adults"]:
-            return f"Invalid audience value. Audience must be 'children', 'young adults' or 'adults'.", None
-        
-        return None, kwargs
+        Returns a list of the converted data for the valid rows and a list of (row number, error message) tuples for the invalid rows. The row numbers are taken from `row_numbers` if given and otherwise count from 1. The method is a class method, so data can be validated without a factory, e.g. in the worker processes of a bulk import; if a `factory` is given, the invalid rows are reported to its listeners.
+        '''
+        
+        books_data = list(books_data)
+        row_numbers = list(row_numbers) if row_numbers is not None else range(1, len(books_data) + 1)
+        errors = {}
+        columns = []
+        for field in Book.FIELDS:
+            column = [data.get(field) for data in books_data]
+            column = ["" if value is None else str(value).strip() for value in column]
+            # The whole column is converted in one go; only a column containing errors is checked row by row.
+            missing_rows = set()
+            if "" in column:
+                for row_index, value in enumerate(column):
+                    if not value:
+                        missing_rows.add(row_index)
+                        errors.setdefault(row_index, []).append(f"Missing or empty required field: {field}.")
+            
+            if field in cls.ENUM_FIELDS:
+                lookup, lookup_error = cls.ENUM_FIELDS[field]
+                column = [lookup.get(value.lower()) for value in column]
+                if None in column:
+                    for row_index, value in enumerate(column):
+                        if value is None and row_index not in missing_rows:
+                            errors.setdefault(row_index, []).append(lookup_error)
+            elif field in cls.NUMERIC_FIELDS:
+                converter = cls.NUMERIC_FIELDS[field]
+                try:
+                    column = list(map(converter, column))
+                except ValueError:
+                    for row_index, value in enumerate(column):
+                        try:
+                            column[row_index] = converter(value)
+                        except ValueError as e:
+                            if row_index not in missing_rows:
+                                errors.setdefault(row_index, []).append(f"Error converting data for {field}: {str(e)}.")
+            columns.append(column)
+        
+        valid_books = [dict(zip(Book.FIELDS, values)) for row_index, values in enumerate(zip(*columns)) if row_index not in errors]
+        bad_rows = [(row_numbers[row_index], " ".join(messages)) for row_index, messages in sorted(errors.items())]
+        if factory is not None:
+            factory.report_bad_rows(bad_rows)
+        return valid_books, bad_rows
+    
+    def _validate_book_data(self, **kwargs):
+        valid_books, bad_rows = self.validate_books_data([kwargs], factory=self)
+        if bad_rows:
+            return bad_rows[0][1], None
+        return None, valid_books[0]
     
     def handle_new_book_input(self, **kwargs):
         validation_error, validated_data = self._validate_book_data(**kwargs)
         if validation_error:
             return validation_error
-        self.create_new_book(**validated_data)
+        return self.create_new_book(**validated_data)
+    
+    def handle_new_books_input(self, books_data):
+        '''
+        Validates a batch of book data, e.g. a supplier feed, and adds all the valid books to the catalogue in one call. Returns a report in the same format as `ingest.bulk_ingest`: the number of rows, the number of books added, the books rejected as duplicates and the invalid rows with all their errors.
+        '''
+        
+        valid_books, bad_rows = self.validate_books_data(books_data, factory=self)
+        rejected_books = self.create_new_books(valid_books)
+        return {"rows": len(valid_books) + len(bad_rows), "added": len(valid_books) - len(rejected_books), "rejected": rejected_books, "bad_rows": bad_rows}
+
+class SortedIndex:
+    '''
+    This class keeps the books of a catalogue sorted by a key function. The index is kept up to date one book at a time, so it never has to re-sort the whole catalogue. A book must be removed from the index before any attribute used by the key function is changed, and added again afterwards.
+    
+    The sorted entries are split into blocks of up to twice `BLOCK_SIZE` entries, so adding or removing a book only shifts the entries of one block instead of the whole list, and the time of an update barely grows with the size of the catalogue. A block is replaced rather than changed in place, so a reader that has taken a copy of the list of blocks sees the index as it was, even if another thread changes it in the meantime.
+    '''
+    
+    BLOCK_SIZE = 512
+    
+    def __init__(self, key_function):
+        self.key_function = key_function
+        self._blocks = []
+        self._length = 0
+    
+    def __len__(self):
+        return self._length
+    
+    def _entry(self, book):
+        return (self.key_function(book), book.book_id, book)
+    
+    @staticmethod
+    def _find_block(blocks, value):
+        # Returns the first block whose last entry is not smaller than `value`, or the number of blocks if there is none.
+        low, high = 0, len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if blocks[middle][-1] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def _replace_blocks(self, index, count, entries):
+        # A block that has grown too large is split in two; the new blocks replace the old ones in a single step.
+        if len(entries) > 2 * self.BLOCK_SIZE:
+            half = len(entries) // 2
+            self._blocks[index:index + count] = [entries[:half], entries[half:]]
+        else:
+            self._blocks[index:index + count] = [entries] if entries else []
+    
+    def _add_entry(self, entry):
+        blocks = self._blocks
+        if not blocks:
+            blocks.append([entry])
+        else:
+            index = min(self._find_block(blocks, entry), len(blocks) - 1)
+            block = blocks[index]
+            position = bisect_left(block, entry)
+            self._replace_blocks(index, 1, block[:position] + [entry] + block[position:])
+        self._length += 1
+    
+    def add(self, book):
+        self._add_entry(self._entry(book))
+    
+    def add_many(self, books):
+        entries = [self._entry(book) for book in books]
+        # A few books are added one at a time; many books are sorted together with the existing entries and split into new blocks.
+        if len(entries) * 16 < self._length:
+            for entry in entries:
+                self._add_entry(entry)
+            return
+        entries.extend(entry for block in self._blocks for entry in block)
+        entries.sort(key=lambda entry: entry[:2])
+        self._blocks = [entries[start:start + self.BLOCK_SIZE] for start in range(0, len(entries), self.BLOCK_SIZE)]
+        self._length = len(entries)
+    
+    def remove(self, book, key=None):
+        # `key` is the key the book was added with, for when the book has already been changed.
+        entry_key = (self.key_function(book) if key is None else key, book.book_id)
+        blocks = self._blocks
+        index = self._find_block(blocks, entry_key)
+        if index == len(blocks):
+            return
+        block = blocks[index]
+        position = bisect_left(block, entry_key)
+        if position == len(block) or block[position][:2] != entry_key:
+            return
+        
+        block = block[:position] + block[position + 1:]
+        self._length -= 1
+        # A block that has become small is merged with a neighbouring block, so the number of blocks stays proportional to the number of books.
+        if len(block) < self.BLOCK_SIZE // 4 and len(blocks) > 1:
+            if index + 1 < len(blocks):
+                self._replace_blocks(index, 2, block + blocks[index + 1])
+            else:
+                self._replace_blocks(index - 1, 2, blocks[index - 1] + block)
+        else:
+            self._replace_blocks(index, 1, block)
+    
+    @classmethod
+    def _position(cls, blocks, value):
+        index = cls._find_block(blocks, value)
+        if index == len(blocks):
+            return sum(map(len, blocks))
+        return sum(map(len, blocks[:index])) + bisect_left(blocks[index], value)
+    
+    def range_positions(self, low=None, high=None, include_low=True, include_high=True):
+        '''
+        Returns the start and stop positions of the entries whose key lies between `low` and `high` (None means unbounded), found by binary search.
+        '''
+        
+        blocks = self._blocks[:]
+        # Every book ID is smaller than infinity, so (key,) sorts before and (key, inf) after all entries with that key.
+        start = 0 if low is None else self._position(blocks, (low,) if include_low else (low, float("inf")))
+        stop = sum(map(len, blocks)) if high is None else self._position(blocks, (high, float("inf")) if include_high else (high,))
+        return start, max(start, stop)
+    
+    def iterate(self, offset=0, limit=None):
+        # The selected entries are copied before the first book is returned, so changes to the index during the iteration do not skip, repeat or lose books.
+        stop = None if limit is None else offset + limit
+        entries = []
+        position = 0
+        for block in self._blocks[:]:
+            if stop is not None and position >= stop:
+                break
+            if position + len(block) > offset:
+                entries.extend(block[max(0, offset - position):None if stop is None else stop - position])
+            position += len(block)
+        return (entry[2] for entry in entries)
+
+class CatalogueListener:
+    '''
+    This class is the base class for objects that want to be told about changes to a catalogue, e.g. to write them to a journal or to keep running totals. A listener is registered with `Catalogue.add_listener` and only needs to override the methods for the changes it cares about. The methods are called after the change has been made.
+    '''
+    
+    def book_added(self, book):
+        pass
+    
+    def book_deleted(self, book):
+        pass
+    
+    def book_updated(self, book, old_values):
+        pass
+    
+    def stock_updated(self, book, stock_change):
+        pass
+    
+    def stocks_updated(self, stock_changes):
+        # A transaction changing the stock of several books, e.g. the sale of a basket, is reported as a list of (book, stock change) tuples. By default each change is passed on to `stock_updated`.
+        for book, stock_change in stock_changes:
+            self.stock_updated(book, stock_change)
 
 class Catalogue:
     '''
     This class is responsible for managing the bookstore catalogue/stock. Thus, it adds newly created books to the catalogue after they have been created in the Factory. The class is also responsible for deletion of a book, for all search functionality, and for generating stock lists.
+    
+    All changes to the catalogue are made under a lock, so the catalogue can be shared between threads. Searches by field and sorted listings do not take the lock; they copy the index entries they read, so a change made by another thread during the read cannot break it. Lookups by ID take the lock, since finding a book by its ID reads both the slot number and the slot, and keyword searches take it, since scoring a search reads the word lists of the full-text index one book at a time.
+    
+    If a `DescriptionStore` is given, the descriptions of the books are moved out of memory and into the store when the books are added, and are only read back when a book's `description` is used.
     '''
     
-    def __init__(self):
-        self.books = []
+    INDEXED_FIELDS = ["title", "author", "category", "medium", "audience"]
+    COMPACTION_MIN_TOMBSTONES = 1024
+    SORTING_KEYS = {
+        "alphabetical_author": lambda book: book.author.split()[-1],
+        "alphabetical_title": lambda book: book.title,
+        "category": lambda book: book.category,
+        "medium": lambda book: book.medium,
+        "ascending_stock": lambda book: book.stock,
+        "descending_stock": lambda book: -book.stock,
+        "selling_price": lambda book: book.selling_price,
+        "purchase_price": lambda book: book.purchase_price,
+        "size": lambda book: book.size
+    }
+    STOCK_SORTING_CHOICES = ["ascending_stock", "descending_stock"]
+    # The numeric fields that can be queried by range, and the sorted view used as the range index for each.
+    RANGE_FIELDS = {"selling_price": "selling_price", "purchase_price": "purchase_price", "stock": "ascending_stock", "size": "size"}
+    QUERY_OPERATORS = ["=", "<", "<=", ">", ">="]
+    
+    def __init__(self, description_store=None):
+        self._description_store = description_store
+        self._slots = []
+        self._slot_by_id = {}
+        self._tombstones = 0
+        self._unique_keys = {}
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}
+        self._sorted_views = {}
+        self._text_index = InvertedIndex()
+        self._unindexed_text = []
+        self._listeners = []
+        self._lock = RLock()
+    
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+    
+    @property
+    def books(self):
+        '''
+        Returns a list of all books in the catalogue in the order they were added.
+        '''
+        
+        return [book for book in self._slots if book is not None]
+    
+    def _book_count(self):
+        return len(self._slot_by_id)
+    
+    @staticmethod
+    def _unique_key(title, author, medium):
+        return (str(title).lower(), str(author).lower(), str(medium).lower())
+    
+    def _index_book(self, book):
+        book_id = book.book_id
+        self._unique_keys[self._unique_key(book.title, book.author, book.medium)] = book
+        for field, index in self._indexes.items():
+            index.setdefault(str(getattr(book, field)).lower(), {})[book_id] = book
+        for sorted_view in self._sorted_views.values():
+            sorted_view.add(book)
+        self._text_index.add_document(book_id, self._searchable_text(book))
+    
+    def _unindex_book(self, book):
+        self._index_loaded_text()
+        book_id = book.book_id
+        del self._unique_keys[self._unique_key(book.title, book.author, book.medium)]
+        for field, index in self._indexes.items():
+            value = str(getattr(book, field)).lower()
+            matches = index[value]
+            del matches[book_id]
+            if not matches:
+                del index[value]
+        for sorted_view in self._sorted_views.values():
+            sorted_view.remove(book)
+        self._text_index.remove_document(book_id, self._searchable_text(book))
+    
+    @staticmethod
+    def _searchable_text(book):
+        return f"{book.title} {book.author} {book.description}"
+    
+    def _index_loaded_text(self):
+        # The books added with `load_books` are added to the text index the first time it is used, so loading a saved catalogue does not have to split every description into words.
+        if self._unindexed_text:
+            with self._lock:
+                for book in self._unindexed_text:
+                    self._text_index.add_document(book.book_id, self._searchable_text(book))
+                self._unindexed_text = []
+    
+    def has_book(self, title, author, medium):
+        return self._unique_key(title, author, medium) in self._unique_keys
+    
+    def _index_matches(self, field, value):
+        '''
+        Hook for storage backends. Returns the books whose lowercase value of an indexed field is `value`, as a dictionary mapping their IDs to the books in the order they were added.
+        '''
+        
+        return self._indexes[field].get(value, {})
+    
+    def get_book(self, book_id):
+        # The slot of a book is looked up under the lock, since the slots are renumbered when the tombstones are compacted away.
+        with self._lock:
+            slot = self._slot_by_id.get(book_id)
+            return None if slot is None else self._slots[slot]
+    
+    def get_book_by_key(self, title, author, medium):
+        '''
+        Returns the book with the given title, author and medium (in any letter case), i.e. the book a new book with these values would be a duplicate of, or None.
+        '''
+        
+        return self._unique_keys.get(self._unique_key(title, author, medium))
     
     def add_book(self, new_book):
-        for book in self.books:
-            if book.title.lower() == new_book.title.lower() and book.author.lower() == new_book.author.lower() and book.medium.lower() == new_book.medium.lower():
-                print(f"The book {new_book.title} by {new_book.author} already exists in the catalogue.")
-                return
-        self.books.append(new_book)
+        with self._lock:
+            key = self._unique_key(new_book.title, new_book.author, new_book.medium)
+            if key in self._unique_keys:
+                return f"The book {new_book.title} by {new_book.author} already exists in the catalogue."
+            new_book._catalogue = self
+            self._index_book(new_book)
+            self._store_description(new_book)
+            self._slot_by_id[new_book.book_id] = len(self._slots)
+            self._slots.append(new_book)
+            for listener in self._listeners:
+                listener.book_added(new_book)
     
-    def delete_book(self, book_id):
+    def _store_description(self, book):
+        if self._description_store is not None and type(book._description) is str:
+            book._description = self._description_store.append(book._description)
+    
+    def add_books(self, new_books):
+        '''
+        Adds a batch of books, e.g. a chunk from a bulk import, and returns a list of messages for the books that were rejected as duplicates.
+        '''
+        
+        rejected_books = []
+        for new_book in new_books:
+            rejection = self.add_book(new_book)
+            if rejection:
+                rejected_books.append(rejection)
+        return rejected_books
+    
+    def load_books(self, books):
+        '''
+        Adds a large number of books in one pass, e.g. when a saved catalogue is loaded. The lock is taken once for the whole batch, the lookup indexes are filled directly, and every sorted view is sorted once after all the books have been added instead of having each book inserted into it. The books are only added to the full-text index when it is first used, since splitting the texts into words takes most of the time of adding a book. Returns a list of messages for the books that were rejected as duplicates.
+        '''
+        
+        with self._lock:
+            rejected_books = []
+            new_books = []
+            unique_keys = self._unique_keys
+            indexes = list(self._indexes.items())
+            for book in books:
+                key = self._unique_key(book.title, book.author, book.medium)
+                if key in unique_keys:
+                    rejected_books.append(f"The book {book.title} by {book.author} already exists in the catalogue.")
+                    continue
+                book._catalogue = self
+                unique_keys[key] = book
+                for field, index in indexes:
+                    index.setdefault(str(getattr(book, field)).lower(), {})[book.book_id] = book
+                self._store_description(book)
+                self._slot_by_id[book.book_id] = len(self._slots)
+                self._slots.append(book)
+                new_books.append(book)
+            self._unindexed_text.extend(new_books)
+            
+            for sorted_view in self._sorted_views.values():
+                sorted_view.add_many(new_books)
+            for listener in self._listeners:
+                for book in new_books:
+                    listener.book_added(book)
+            return rejected_books
+    
+    def _remove_book(self, book_id):
+        '''
+        Removes a book without compacting the slots. The slot of the removed book is left as a tombstone, so the removal does not have to shift the books after it. Returns a tuple of a success flag and a message.
+        '''
+        
         try:
             book_id = int(book_id)
-        except ValueError:
-            print(f"Invalid book ID. Please provide an ID consisting of only numeric characters.")
+        except (TypeError, ValueError):
+            return False, f"Invalid book ID: {book_id}. Please provide an ID consisting of only numeric characters."
         
-        for book in self.books:
-            if book.book_id == book_id:
-                self.books.remove(book)
-                return f"The book with the title '{book.title}' and the ID {book_id} was successfully removed."
-
-        return f"No book with the provided ID {book_id} was found in the catalogue."
+        slot = self._slot_by_id.pop(book_id, None)
+        if slot is None:
+            return False, f"No book with the provided ID {book_id} was found in the catalogue."
+        
+        book = self._slots[slot]
+        message = f"The book with the title '{book.title}' and the ID {book_id} was successfully removed."
+        self._slots[slot] = None
+        self._tombstones += 1
+        self._unindex_book(book)
+        for listener in self._listeners:
+            listener.book_deleted(book)
+        # The removed book keeps its description in memory, since it can no longer read it from the catalogue's description store.
+        book.description = book.description
+        book._catalogue = None
+        return True, message
+    
+    def _compact_if_needed(self):
+        if self._tombstones >= self.COMPACTION_MIN_TOMBSTONES and self._tombstones >= self._book_count():
+            self._compact()
+    
+    def _compact(self):
+        '''
+        Removes the tombstones left by deleted books and renumbers the slots of the remaining books.
+        '''
+        
+        self._slots = [book for book in self._slots if book is not None]
+        self._slot_by_id = {book.book_id: slot for slot, book in enumerate(self._slots)}
+        self._tombstones = 0
+    
+    def delete_book(self, book_id):
+        with self._lock:
+            deleted, message = self._remove_book(book_id)
+            if deleted:
+                self._compact_if_needed()
+            return message
+    
+    def delete_books(self, book_ids):
+        '''
+        Deletes several books in one pass, e.g. when a batch of titles is delisted. Returns a list with one dictionary per requested ID, stating whether the book was deleted and why not, if it wasn't.
+        '''
+        
+        with self._lock:
+            results = []
+            for book_id in book_ids:
+                deleted, message = self._remove_book(book_id)
+                results.append({"book_id": book_id, "deleted": deleted, "message": message})
+            self._compact_if_needed()
+            return results
+    
+    def update_book(self, book_id, **changes):
+        '''
+        Updates the attributes of an existing book. The book is removed from all indexes before the update and re-indexed afterwards, so the duplicate check in `add_book` and the search indexes stay correct. An update that would turn the book into a duplicate of another book is rejected.
+        '''
+        
+        with self._lock:
+            book = self.get_book(book_id)
+            if book is None:
+                return f"No book with the provided ID {book_id} was found in the catalogue."
+            
+            old_key = self._unique_key(book.title, book.author, book.medium)
+            new_key = self._unique_key(changes.get("title", book.title), changes.get("author", book.author), changes.get("medium", book.medium))
+            if new_key != old_key and self.has_book(*new_key):
+                return f"The book {changes.get('title', book.title)} by {changes.get('author', book.author)} already exists in the catalogue."
+            
+            old_values = {attribute: getattr(book, attribute) for attribute in changes}
+            self._unindex_book(book)
+            for attribute, value in changes.items():
+                setattr(book, attribute, value)
+            self._index_book(book)
+            self._store_description(book)
+            for listener in self._listeners:
+                listener.book_updated(book, old_values)
+    
+    def update_stock(self, book_id, stock_change):
+        '''
+        Changes the stock of a book. A change that would make the stock negative is rejected and returns an error message. Only the stock-sorted views are updated, since no other index depends on the stock.
+        '''
+        
+        with self._lock:
+            validation_error = self._check_stock_changes({book_id: stock_change})
+            if validation_error:
+                return validation_error
+            
+            book = self._change_stock(book_id, stock_change)
+            for listener in self._listeners:
+                listener.stock_updated(book, stock_change)
+    
+    def _change_stock(self, book_id, stock_change):
+        book = self.get_book(book_id)
+        stock_views = [self._sorted_views[choice] for choice in self.STOCK_SORTING_CHOICES if choice in self._sorted_views]
+        for sorted_view in stock_views:
+            sorted_view.remove(book)
+        book.stock += stock_change
+        for sorted_view in stock_views:
+            sorted_view.add(book)
+        return book
+    
+    def update_stocks(self, stock_changes):
+        '''
+        Changes the stock of several books as one transaction, e.g. for a sale of a whole basket of books. `stock_changes` maps book IDs to stock changes. If any book is missing or would get a negative stock, no stock is changed at all and an error message is returned. The listeners are told about the whole transaction at once with `stocks_updated`, so e.g. a journal can record it as a single entry.
+        '''
+        
+        with self._lock:
+            validation_error = self._check_stock_changes(stock_changes)
+            if validation_error:
+                return validation_error
+            
+            changed_books = [(self._change_stock(book_id, stock_change), stock_change) for book_id, stock_change in stock_changes.items()]
+            for listener in self._listeners:
+                listener.stocks_updated(changed_books)
+    
+    def _check_stock_changes(self, stock_changes):
+        for book_id, stock_change in stock_changes.items():
+            book = self.get_book(book_id)
+            if book is None:
+                return f"No book with the provided ID {book_id} was found in the catalogue."
+            if book.stock + stock_change < 0:
+                return f"Insufficient stock for the book {book.title}. Current stock is {book.stock}, so the stock cannot be changed by {stock_change}."
     
     def get_unique_categories(self):
-        unique_categories = {book.category for book in self.books}
+        unique_categories = {book.category for book in self._slots if book is not None}
         return [{"id": index, "category": category} for index, category in enumerate(unique_categories, start=1)]
     
-    def search_book(self, query_type, query_value):        
+    def find_books(self, query_type, query_value):
+        '''
+        Looks up books through the index matching the query type and returns a tuple of a validation error (or None) and a list of the matching `Book` objects in the order they were added to the catalogue.
+        '''
+        
         validation_error, validated_query_type, validated_query_value = self._validate_query(query_type, query_value)
+        if validation_error:
+            return validation_error, []
+        
+        if validated_query_type == "book_id":
+            book = self.get_book(int(validated_query_value))
+            return None, [book] if book is not None else []
+        
+        return None, list(self._index_matches(validated_query_type, validated_query_value).values())
+    
+    def find_books_by_keywords(self, keywords, limit=10):
+        '''
+        Searches the words in the title, author and description of all books and returns a tuple of a validation error (or None) and a list of up to `limit` matching `Book` objects, best match first. A keyword ending with `*` matches all words starting with it.
+        '''
+        
+        keywords = str(keywords).strip()
+        if not keywords:
+            return "Please provide at least one keyword to search for.", []
+        
+        with self._lock:
+            self._index_loaded_text()
+            return None, [self.get_book(book_id) for book_id, score in self._text_index.search(keywords, limit)]
+    
+    def keyword_search(self, keywords, limit=10):
+        validation_error, matching_books = self.find_books_by_keywords(keywords, limit)
         if validation_error:
             return validation_error
         
-        matching_books = []
-        for book in self.books:
-            attribute_value = str(getattr(book, validated_query_type)).lower()
-            if attribute_value == validated_query_value:
-                matching_books.append(str(book))
+        if matching_books:
+            return "\n".join(str(book) for book in matching_books)
+        else:
+            return f"No books matching the keywords {keywords} found in the catalogue."
+    
+    def search_book(self, query_type, query_value):        
+        validation_error, matching_books = self.find_books(query_type, query_value)
+        if validation_error:
+            return validation_error
         
         if matching_books:
-            return "\n".join(matching_books)
+            return "\n".join(str(book) for book in matching_books)
         else:
             return f"No books matching the query type {query_type} and the query value {query_value} found in the catalogue."
-
+    
     def _validate_query(self, query_type, query_value):
         try:
             query_type = str(query_type).strip().lower()
         except ValueError:
-            return f"Error converting query type to a string: {query_type}.", None
+            return f"Error converting query type to a string: {query_type}.", None, None
         
         try:
             query_value = str(query_value).strip().lower()
         except ValueError:
-            return f"Error converting query value to a string: {query_value}", None
+            return f"Error converting query value to a string: {query_value}", None, None
         
         if query_type == "book_id":
             try:
                 int(query_value)
             except ValueError:
-                return f"Invalid {query_type}: {query_value}. Please provide a valid ID consisting of only numerical characters.", None
-        elif query_type not in ["title", "author", "category", "medium"]:
-            return f"Invalid query type: {query_type}. Please provide one of the following query types: id, title, author, category, or medium.", None
+                return f"Invalid {query_type}: {query_value}. Please provide a valid ID consisting of only numerical characters.", None, None
+        elif query_type not in self.INDEXED_FIELDS:
+            return f"Invalid query type: {query_type}. Please provide one of the following query types: book_id, title, author, category, medium, or audience.", None, None
         
         return None, query_type, query_value
     
-    def generate_stock_lists(self, sorting_choice):
-        sorted_books = []
-        
-        if sorting_choice == "alphabetical_author":
-            self.books.sort(key=lambda book: book.author.split()[-1])
-        elif sorting_choice == "alphabetical_title":
-            self.books.sort(key=lambda book: book.title)
-        elif sorting_choice == "category":
-            self.books.sort(key=lambda book: book.category)
-        elif sorting_choice == "medium":
-            self.books.sort(key=lambda book: book.medium)
-        elif sorting_choice == "ascending_stock":
-            self.books.sort(key=lambda book: book.stock)
-        elif sorting_choice == "descending_stock":
-            self.books.sort(key=lambda book: book.stock, reverse=True)
-        
-        for book in self.books:
-            sorted_books.append(str(book))
-        
-        return "\n".join(sorted_books)
\ No newline at end of file
+    def _validate_predicates(self, predicates):
+        '''
+        Validates the predicates of a compound query. Returns a tuple of a validation error (or None), a list of (field, value) equality predicates, and a dictionary with the combined [low, include_low, high, include_high] range for each range field.
+        '''
+        
+        equalities = []
+        ranges = {}
+        for predicate in predicates:
+            try:
+                field, operator, value = predicate
+            except (TypeError, ValueError):
+                return f"Invalid predicate: {predicate}. Each predicate must consist of a field, an operator and a value.", [], {}
+            field = str(field).strip().lower()
+            if operator not in self.QUERY_OPERATORS:
+                return f"Invalid operator: {operator}. Please provide one of the following operators: {', '.join(self.QUERY_OPERATORS)}.", [], {}
+            
+            if field in self.INDEXED_FIELDS and operator == "=":
+                equalities.append((field, str(value).strip().lower()))
+                continue
+            if field not in self.RANGE_FIELDS:
+                return f"Invalid query field: {field}. Equality (=) is supported on {', '.join(self.INDEXED_FIELDS)}, and all operators on {', '.join(self.RANGE_FIELDS)}.", [], {}
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return f"Invalid value for {field}: {value}. Please provide a number.", [], {}
+            
+            # Several predicates on the same field are combined into the narrowest range.
+            bounds = ranges.setdefault(field, [None, True, None, True])
+            if operator in ("=", ">", ">="):
+                include_low = operator != ">"
+                if bounds[0] is None or value > bounds[0] or (value == bounds[0] and not include_low):
+                    bounds[0], bounds[1] = value, include_low
+            if operator in ("=", "<", "<="):
+                include_high = operator != "<"
+                if bounds[2] is None or value < bounds[2] or (value == bounds[2] and not include_high):
+                    bounds[2], bounds[3] = value, include_high
+        return None, equalities, ranges
+    
+    @staticmethod
+    def _validate_limit(limit):
+        if limit is not None and (type(limit) is not int or limit < 0):
+            return f"Invalid limit: {limit}. Please provide a whole number of 0 or more."
+    
+    def query_books(self, predicates, sorting_choice=None, limit=None):
+        '''
+        Finds the books matching all of a list of predicates and returns a tuple of a validation error (or None) and a lazy iterator over the matching `Book` objects. A predicate is a tuple of a field, an operator and a value: equality (`=`) on title, author, category, medium or audience, and `=`, `<`, `<=`, `>` or `>=` on selling_price, purchase_price, stock or size, e.g. `[("audience", "=", "adults"), ("medium", "=", "audiobook"), ("selling_price", "<", 20), ("stock", "<", 10)]`.
+        
+        The equality predicates use the lookup indexes, and the range predicates use the sorted views as range indexes. The index with the fewest matching books is read first, and only those books are checked against the other predicates. The result can be sorted by a sorting choice and limited to `limit` books.
+        '''
+        
+        validation_error, equalities, ranges = self._validate_predicates(predicates)
+        if validation_error:
+            return validation_error, iter(())
+        if sorting_choice is not None and sorting_choice not in self.SORTING_KEYS:
+            return f"Invalid sorting choice: {sorting_choice}. Please provide one of the following sorting choices: {', '.join(self.SORTING_KEYS)}.", iter(())
+        validation_error = self._validate_limit(limit)
+        if validation_error:
+            return validation_error, iter(())
+        
+        # Each candidate is the number of books an index matches and a function returning those books. Only the smallest candidate is read.
+        equality_indexes = [self._index_matches(field, value) for field, value in equalities]
+        candidates = [(len(index), index.values) for index in equality_indexes]
+        for field, (low, include_low, high, include_high) in ranges.items():
+            sorted_view = self._get_sorted_view(self.RANGE_FIELDS[field])
+            start, stop = sorted_view.range_positions(low, high, include_low, include_high)
+            candidates.append((stop - start, lambda sorted_view=sorted_view, start=start, stop=stop: sorted_view.iterate(start, stop - start)))
+        if not candidates:
+            candidates.append((self._book_count(), lambda: self.books))
+        book_count, read_books = min(candidates, key=lambda candidate: candidate[0])
+        books = list(read_books())
+        
+        def matches(book):
+            for index in equality_indexes:
+                if book.book_id not in index:
+                    return False
+            for field, (low, include_low, high, include_high) in ranges.items():
+                value = getattr(book, field)
+                if low is not None and (value < low or (value == low and not include_low)):
+                    return False
+                if high is not None and (value > high or (value == high and not include_high)):
+                    return False
+            return True
+        
+        matching_books = filter(matches, books)
+        if sorting_choice is None:
+            return None, islice(matching_books, limit)
+        key_function = self.SORTING_KEYS[sorting_choice]
+        sort_key = lambda book: (key_function(book), book.book_id)
+        return None, iter(nsmallest(limit, matching_books, key=sort_key) if limit is not None else sorted(matching_books, key=sort_key))
+    
+    def _get_sorted_view(self, sorting_choice):
+        '''
+        Returns the sorted view for a sorting choice. A view is built the first time it is requested and is then kept up to date as books are added, updated and deleted.
+        '''
+        
+        with self._lock:
+            sorted_view = self._sorted_views.get(sorting_choice)
+            if sorted_view is None:
+                sorted_view = SortedIndex(self.SORTING_KEYS[sorting_choice])
+                sorted_view.add_many(self.books)
+                self._sorted_views[sorting_choice] = sorted_view
+            return sorted_view
+    
+    def iterate_stock_list(self, sorting_choice, offset=0, limit=None):
+        '''
+        Returns a tuple of a validation error (or None) and an iterator over the books sorted by the sorting choice. `offset` and `limit` select a single page of the sorted list.
+        '''
+        
+        if sorting_choice not in self.SORTING_KEYS:
+            return f"Invalid sorting choice: {sorting_choice}. Please provide one of the following sorting choices: {', '.join(self.SORTING_KEYS)}.", iter(())
+        return None, self._get_sorted_view(sorting_choice).iterate(offset, limit)
+    
+    def generate_stock_lists(self, sorting_choice, offset=0, limit=None):
+        validation_error, sorted_books = self.iterate_stock_list(sorting_choice, offset, limit)
+        if validation_error:
+            return validation_error
+        
+        return "\n".join(str(book) for book in sorted_books)
+    
+    def write_stock_list(self, sorting_choice, file, offset=0, limit=None):
+        '''
+        Writes a sorted stock list to an open file one book at a time, so a long list never has to be held in memory as a single string. Returns a validation error or None.
+        '''
+        
+        validation_error, sorted_books = self.iterate_stock_list(sorting_choice, offset, limit)
+        if validation_error:
+            return validation_error
+        
+        for book in sorted_books:
+            file.write(f"{book}\n")
+    
+    def lowest_stock(self, count):
+        '''
+        Returns the `count` books with the lowest stock. If the ascending stock view already exists, it is read directly; otherwise the books are found without sorting the whole catalogue.
+        '''
+        
+        if "ascending_stock" in self._sorted_views:
+            return list(self._sorted_views["ascending_stock"].iterate(0, count))
+        return nsmallest(count, (book for book in self._slots if book is not None), key=lambda book: (book.stock, book.book_id))
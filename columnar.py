@@ -0,0 +1,524 @@
+from array import array
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from itertools import chain, compress
+
+from classes import Audiobook, Book, Catalogue, EBook, PrintedBook
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EMPTY = -1
+DELETED = -2
+HASH_MASK = (1 << 64) - 1
+
+class RowTable:
+    '''
+    This class is a compact hash table, which finds the rows of a `ColumnarCatalogue` by a key, e.g. a book ID or a lowercase title. The table only stores row numbers, all in one array, so it costs a few bytes per book instead of a dictionary entry and a key object. The keys themselves stay in the columns: the table returns the rows stored under a hash, and the caller checks which of them really have the key. Several rows can be stored under the same key.
+    
+    Collisions are resolved by open addressing with the same probe sequence as Python's dictionaries. A removed row is marked as deleted, so the rows after it can still be found, until the table grows and is rebuilt with `row_hash`, which returns the hash of the key of a row.
+    '''
+    
+    def __init__(self, row_hash, slots=None, used=0):
+        self.row_hash = row_hash
+        self._slots = slots if slots is not None else array("q", [EMPTY]) * 8
+        self._used = used
+        self._deleted = 0
+    
+    def __len__(self):
+        return self._used
+    
+    @staticmethod
+    def _probe(slots, key_hash):
+        mask = len(slots) - 1
+        perturb = key_hash & HASH_MASK
+        index = perturb & mask
+        while True:
+            yield index
+            perturb >>= 5
+            index = (index * 5 + perturb + 1) & mask
+    
+    def candidates(self, key_hash):
+        '''
+        Returns the rows stored under the hash. The caller must check the keys of the rows, since different keys can have the same hash.
+        '''
+        
+        # The probe sequence of `_probe` is written out here, since this is the path of every lookup.
+        slots = self._slots
+        mask = len(slots) - 1
+        perturb = key_hash & HASH_MASK
+        index = perturb & mask
+        rows = []
+        row = slots[index]
+        while row != EMPTY:
+            if row != DELETED:
+                rows.append(row)
+            perturb >>= 5
+            index = (index * 5 + perturb + 1) & mask
+            row = slots[index]
+        return rows
+    
+    def add(self, key_hash, row):
+        if (self._used + self._deleted + 1) * 3 > len(self._slots) * 2:
+            self._rebuild()
+        slots = self._slots
+        for index in self._probe(slots, key_hash):
+            if slots[index] < 0:
+                if slots[index] == DELETED:
+                    self._deleted -= 1
+                slots[index] = row
+                self._used += 1
+                return
+    
+    def remove(self, key_hash, row):
+        slots = self._slots
+        for index in self._probe(slots, key_hash):
+            if slots[index] == row:
+                slots[index] = DELETED
+                self._used -= 1
+                self._deleted += 1
+                return
+            if slots[index] == EMPTY:
+                return
+    
+    def _rebuild(self):
+        # The new table has room for the rows with a load of at most two thirds, and is published in one step, so a reader never sees it half-filled.
+        capacity = 8
+        while capacity * 2 < (self._used + 1) * 3:
+            capacity *= 2
+        slots = array("q", [EMPTY]) * capacity
+        for row in self._slots:
+            if row >= 0:
+                for index in self._probe(slots, self.row_hash(row)):
+                    if slots[index] == EMPTY:
+                        slots[index] = row
+                        break
+        self._slots = slots
+        self._deleted = 0
+    
+    def renumbered(self, new_rows, row_hash):
+        '''
+        Returns a copy of the table in which every row is replaced by its new number from `new_rows`, e.g. after the columns have been compacted. The positions of the rows do not depend on their numbers, so nothing has to be hashed again.
+        '''
+        
+        slots = array("q", [new_rows[row] if row >= 0 else row for row in self._slots])
+        table = RowTable(row_hash, slots, self._used)
+        table._deleted = self._deleted
+        return table
+
+class _Storage:
+    '''
+    The columns, the text blobs and the lookup tables of a `ColumnarCatalogue`. The storage is replaced as a whole when the catalogue is compacted, so a reader that has taken the storage always sees row numbers and columns that belong together.
+    '''
+    
+    __slots__ = ("columns", "texts", "live", "rows_by_id", "rows_by_key", "rows_by_title", "rows_by_author")
+    
+    def __init__(self, columns, texts, live, rows_by_id, rows_by_key, rows_by_title, rows_by_author):
+        self.columns = columns
+        self.texts = texts
+        self.live = live
+        self.rows_by_id = rows_by_id
+        self.rows_by_key = rows_by_key
+        self.rows_by_title = rows_by_title
+        self.rows_by_author = rows_by_author
+
+def _column_property(name):
+    def getter(self):
+        storage, row = self._catalogue._locate(self)
+        return storage.columns[name][row]
+    
+    def setter(self, value):
+        storage, row = self._catalogue._locate(self)
+        storage.columns[name][row] = value
+    
+    return property(getter, setter)
+
+def _coded_property(name):
+    def getter(self):
+        storage, row = self._catalogue._locate(self)
+        return self._catalogue._code_values[name][storage.columns[name][row]]
+    
+    def setter(self, value):
+        storage, row = self._catalogue._locate(self)
+        storage.columns[name][row] = self._catalogue._encode(name, value)
+    
+    return property(getter, setter)
+
+def _text_property(name):
+    def getter(self):
+        storage, row = self._catalogue._locate(self)
+        return self._catalogue._read_text(storage, name, row)
+    
+    def setter(self, value):
+        storage, row = self._catalogue._locate(self)
+        storage.columns[name][row] = self._catalogue._append_text(storage, name, value)
+    
+    return property(getter, setter)
+
+class BookView:
+    '''
+    This class is a lightweight view of one book in a `ColumnarCatalogue`. The view only holds a reference to the catalogue, the book's ID and the row it was last found in; all book data is read from and written to the catalogue's columns. The view supports the same attributes and methods as the book classes, so it can be used anywhere a book object is expected. The methods are shared with `Book` rather than inherited, since inheriting from `Book` would give every view its own `__dict__`.
+    
+    Views are created when books are read from the catalogue and are not kept by it. If the rows have been compacted since a view was created, the view finds its book again by its ID. Once its book is deleted, reading or changing a view raises an `AttributeError` instead of returning the data of another row.
+    '''
+    
+    __slots__ = ("_catalogue", "_row", "book_id")
+    
+    SIZE_DESCRIPTIONS = {"printed": PrintedBook, "audiobook": Audiobook, "e-book": EBook}
+    
+    def __init__(self, catalogue, row, book_id):
+        self._catalogue = catalogue
+        self._row = row
+        self.book_id = book_id
+    
+    title = _text_property("title")
+    description = _text_property("description")
+    author = _coded_property("author")
+    category = _coded_property("category")
+    medium = _coded_property("medium")
+    audience = _coded_property("audience")
+    size = _column_property("size")
+    purchase_price = _column_property("purchase_price")
+    selling_price = _column_property("selling_price")
+    stock = _column_property("stock")
+    
+    # The medium specific size attributes of the child classes all refer to the size column.
+    num_pages = size
+    byte_size = size
+    length_minutes = size
+    
+    __str__ = Book.__str__
+    show_purchase_price = Book.show_purchase_price
+    show_selling_price = Book.show_selling_price
+    show_stock = Book.show_stock
+    update_stock = Book.update_stock
+    
+    def show_book_size(self):
+        book_class = self.SIZE_DESCRIPTIONS.get(self.medium.lower(), Book)
+        return book_class.show_book_size(self)
+
+class _RowMatches:
+    '''
+    The books of a `ColumnarCatalogue` matching one value of an indexed field, in the form `Catalogue._index_matches` returns them: the number of matches, the matching books with `values`, and a membership test by book ID. The books are only read from the columns when they are used, so a query can count the matches of every predicate and read only the smallest set.
+    '''
+    
+    def __init__(self, catalogue, storage, count, read_rows, row_matches):
+        self.catalogue = catalogue
+        self.storage = storage
+        self.count = count
+        self.read_rows = read_rows
+        self.row_matches = row_matches
+    
+    def __len__(self):
+        return self.count
+    
+    def __contains__(self, book_id):
+        row = self.catalogue._find_row(self.storage, book_id)
+        return row is not None and self.row_matches(row)
+    
+    def values(self):
+        book_ids = self.storage.columns["book_id"]
+        return [BookView(self.catalogue, row, book_ids[row]) for row in self.read_rows()]
+
+class ColumnarCatalogue(Catalogue):
+    '''
+    This class is a catalogue that stores its books column by column instead of as one object per book, so a large catalogue takes a fraction of the memory. Numeric fields are kept in compact arrays, and author, category, medium and audience are stored as small integer codes. Titles and descriptions are stored as UTF-8 in one blob per field, with an array holding the offset and length of the text of every row; a changed text is appended to the blob, and the old text is dropped when the columns are compacted.
+    
+    The books are found by row number: book IDs, titles and the duplicate check use `RowTable`s, which only hold row numbers, and every author has a sorted array of its rows. Category, medium and audience are looked up by scanning their code columns. The books returned by the catalogue are `BookView` objects, which are created when they are read and read their data from the columns. The full-text index is only built when the first keyword search is made.
+    
+    Apart from the storage, the class behaves like `Catalogue`, so it can be passed to a `Factory` in the same way. The numeric and coded columns can be read directly with `column`, or as NumPy arrays with `numpy_column` when NumPy is installed, for vectorized calculations.
+    '''
+    
+    NUMERIC_COLUMNS = {"book_id": "q", "size": "q", "purchase_price": "d", "selling_price": "d", "stock": "q"}
+    CODED_COLUMNS = {"author": "I", "category": "B", "medium": "B", "audience": "B"}
+    TEXT_COLUMNS = ["title", "description"]
+    # The location of a text is its offset in the blob shifted left by LENGTH_BITS, plus its length in bytes.
+    LENGTH_BITS = 24
+    
+    def __init__(self):
+        super().__init__()
+        self._code_values = {name: [] for name in self.CODED_COLUMNS}
+        self._codes = {name: {} for name in self.CODED_COLUMNS}
+        self._codes_by_lowercase = {name: {} for name in self.CODED_COLUMNS}
+        self._text_index_built = False
+        columns = {name: array(typecode) for name, typecode in self.NUMERIC_COLUMNS.items()}
+        columns.update({name: array(typecode) for name, typecode in self.CODED_COLUMNS.items()})
+        columns.update({name: array("Q") for name in self.TEXT_COLUMNS})
+        self._storage = _Storage(columns, {name: bytearray() for name in self.TEXT_COLUMNS}, bytearray(), RowTable(self._id_hash), RowTable(self._key_hash), RowTable(self._title_hash), {})
+    
+    def _encode(self, name, value):
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._code_values[name])
+            codes[value] = code
+            self._code_values[name].append(value)
+            self._codes_by_lowercase[name].setdefault(str(value).lower(), []).append(code)
+        return code
+    
+    def _append_text(self, storage, name, text):
+        data = str(text).encode("utf-8")
+        if len(data) >> self.LENGTH_BITS:
+            raise ValueError(f"The {name} is too long to be stored: {len(data)} bytes.")
+        blob = storage.texts[name]
+        location = (len(blob) << self.LENGTH_BITS) | len(data)
+        blob.extend(data)
+        return location
+    
+    def _read_text(self, storage, name, row):
+        location = storage.columns[name][row]
+        offset = location >> self.LENGTH_BITS
+        return storage.texts[name][offset:offset + (location & ((1 << self.LENGTH_BITS) - 1))].decode("utf-8")
+    
+    def _row_key(self, storage, row):
+        columns = storage.columns
+        return self._unique_key(self._read_text(storage, "title", row), self._code_values["author"][columns["author"][row]], self._code_values["medium"][columns["medium"][row]])
+    
+    # The hash functions used to rebuild the lookup tables when they grow. They read the rows of the current storage, since only the current storage is ever changed.
+    def _id_hash(self, row):
+        return hash(self._storage.columns["book_id"][row])
+    
+    def _key_hash(self, row):
+        return hash(self._row_key(self._storage, row))
+    
+    def _title_hash(self, row):
+        return hash(self._read_text(self._storage, "title", row).lower())
+    
+    def _find_row(self, storage, book_id):
+        book_ids = storage.columns["book_id"]
+        for row in storage.rows_by_id.candidates(hash(book_id)):
+            if book_ids[row] == book_id:
+                return row
+    
+    def _find_row_by_key(self, storage, key):
+        for row in storage.rows_by_key.candidates(hash(key)):
+            if self._row_key(storage, row) == key:
+                return row
+    
+    def _locate(self, view):
+        '''
+        Returns the current storage and the row of the book a view belongs to. A view whose row has been compacted away finds its book again by its ID; a view of a deleted book raises an `AttributeError`.
+        '''
+        
+        storage = self._storage
+        row = view._row
+        if row < len(storage.live) and storage.live[row] and storage.columns["book_id"][row] == view.book_id:
+            return storage, row
+        row = self._find_row(storage, view.book_id)
+        if row is None:
+            raise AttributeError(f"The book with the ID {view.book_id} is no longer in the catalogue.")
+        view._row = row
+        return storage, row
+    
+    def _view(self, storage, row):
+        return BookView(self, row, storage.columns["book_id"][row])
+    
+    @property
+    def books(self):
+        storage = self._storage
+        return [self._view(storage, row) for row in compress(range(len(storage.live)), storage.live)]
+    
+    def _book_count(self):
+        return len(self._storage.rows_by_id)
+    
+    def has_book(self, title, author, medium):
+        return self._find_row_by_key(self._storage, self._unique_key(title, author, medium)) is not None
+    
+    def get_book(self, book_id):
+        storage = self._storage
+        row = self._find_row(storage, book_id)
+        return None if row is None else self._view(storage, row)
+    
+    def get_book_by_key(self, title, author, medium):
+        storage = self._storage
+        row = self._find_row_by_key(storage, self._unique_key(title, author, medium))
+        return None if row is None else self._view(storage, row)
+    
+    def _index_matches(self, field, value):
+        storage = self._storage
+        if field == "title":
+            rows = sorted(row for row in storage.rows_by_title.candidates(hash(value)) if self._read_text(storage, "title", row).lower() == value)
+            return _RowMatches(self, storage, len(rows), lambda: rows, set(rows).__contains__)
+        
+        codes = set(self._codes_by_lowercase[field].get(value, ()))
+        column = storage.columns[field]
+        if field == "author":
+            author_rows = [storage.rows_by_author.get(code, ()) for code in codes]
+            return _RowMatches(self, storage, sum(map(len, author_rows)), lambda: sorted(chain(*author_rows)), lambda row: column[row] in codes)
+        
+        # Category, medium and audience have few values, each shared by a large part of the books, so their code columns are scanned instead of indexed. The count is only used to plan queries, so it includes deleted rows.
+        live = storage.live
+        return _RowMatches(self, storage, sum(map(column.count, codes)), lambda: [row for row in compress(range(len(column)), map(codes.__contains__, column)) if live[row]], lambda row: column[row] in codes)
+    
+    def _insert_row(self, storage, book):
+        columns = storage.columns
+        for name in self.NUMERIC_COLUMNS:
+            columns[name].append(getattr(book, name))
+        for name in self.CODED_COLUMNS:
+            columns[name].append(self._encode(name, getattr(book, name)))
+        for name in self.TEXT_COLUMNS:
+            columns[name].append(self._append_text(storage, name, getattr(book, name)))
+        # The row is only marked as live and published in the ID table once all its columns are filled in.
+        storage.live.append(1)
+        row = len(storage.live) - 1
+        storage.rows_by_id.add(hash(book.book_id), row)
+        return row
+    
+    def _index_row(self, storage, row):
+        storage.rows_by_key.add(hash(self._row_key(storage, row)), row)
+        storage.rows_by_title.add(hash(self._read_text(storage, "title", row).lower()), row)
+        insort(storage.rows_by_author.setdefault(storage.columns["author"][row], array("I")), row)
+    
+    def _unindex_row(self, storage, row):
+        storage.rows_by_key.remove(hash(self._row_key(storage, row)), row)
+        storage.rows_by_title.remove(hash(self._read_text(storage, "title", row).lower()), row)
+        author_code = storage.columns["author"][row]
+        author_rows = storage.rows_by_author[author_code]
+        del author_rows[bisect_left(author_rows, row)]
+        if not author_rows:
+            del storage.rows_by_author[author_code]
+    
+    def _index_book(self, book):
+        storage, row = self._locate(book)
+        self._index_row(storage, row)
+        for sorted_view in self._sorted_views.values():
+            sorted_view.add(book)
+        if self._text_index_built:
+            self._text_index.add_document(book.book_id, self._searchable_text(book))
+    
+    def _unindex_book(self, book):
+        storage, row = self._locate(book)
+        self._unindex_row(storage, row)
+        for sorted_view in self._sorted_views.values():
+            sorted_view.remove(book)
+        if self._text_index_built:
+            self._text_index.remove_document(book.book_id, self._searchable_text(book))
+    
+    def _index_loaded_text(self):
+        if not self._text_index_built:
+            with self._lock:
+                if not self._text_index_built:
+                    for book in self.books:
+                        self._text_index.add_document(book.book_id, self._searchable_text(book))
+                    self._text_index_built = True
+    
+    def add_book(self, new_book):
+        with self._lock:
+            if self.has_book(new_book.title, new_book.author, new_book.medium):
+                return f"The book {new_book.title} by {new_book.author} already exists in the catalogue."
+            storage = self._storage
+            book = BookView(self, self._insert_row(storage, new_book), new_book.book_id)
+            self._index_book(book)
+            for listener in self._listeners:
+                listener.book_added(book)
+    
+    def load_books(self, books):
+        with self._lock:
+            rejected_books = []
+            new_books = []
+            storage = self._storage
+            for book in books:
+                if self.has_book(book.title, book.author, book.medium):
+                    rejected_books.append(f"The book {book.title} by {book.author} already exists in the catalogue.")
+                    continue
+                row = self._insert_row(storage, book)
+                self._index_row(storage, row)
+                new_books.append(BookView(self, row, book.book_id))
+            
+            if self._text_index_built:
+                for book in new_books:
+                    self._text_index.add_document(book.book_id, self._searchable_text(book))
+            for sorted_view in self._sorted_views.values():
+                sorted_view.add_many(new_books)
+            for listener in self._listeners:
+                for book in new_books:
+                    listener.book_added(book)
+            return rejected_books
+    
+    def _remove_book(self, book_id):
+        try:
+            book_id = int(book_id)
+        except (TypeError, ValueError):
+            return False, f"Invalid book ID: {book_id}. Please provide an ID consisting of only numeric characters."
+        
+        storage = self._storage
+        row = self._find_row(storage, book_id)
+        if row is None:
+            return False, f"No book with the provided ID {book_id} was found in the catalogue."
+        
+        book = BookView(self, row, book_id)
+        message = f"The book with the title '{book.title}' and the ID {book_id} was successfully removed."
+        self._unindex_book(book)
+        # The listeners can still read the book; the row is marked as deleted afterwards and is dropped when the columns are compacted.
+        for listener in self._listeners:
+            listener.book_deleted(book)
+        storage.rows_by_id.remove(hash(book_id), row)
+        storage.live[row] = 0
+        self._tombstones += 1
+        return True, message
+    
+    def _compact(self):
+        '''
+        Removes the rows of deleted books and the texts that are no longer used from the columns, and renumbers the rows in the lookup tables. The new storage is published in one step.
+        '''
+        
+        storage = self._storage
+        live = storage.live
+        new_rows = array("q", [EMPTY]) * len(live)
+        for new_row, row in enumerate(compress(range(len(live)), live)):
+            new_rows[row] = new_row
+        
+        columns = {name: array(column.typecode, compress(column, live)) for name, column in storage.columns.items()}
+        texts = {}
+        length_mask = (1 << self.LENGTH_BITS) - 1
+        for name in self.TEXT_COLUMNS:
+            blob = storage.texts[name]
+            texts[name] = bytearray()
+            locations = columns[name]
+            for row, location in enumerate(locations):
+                offset, length = location >> self.LENGTH_BITS, location & length_mask
+                locations[row] = (len(texts[name]) << self.LENGTH_BITS) | length
+                texts[name] += blob[offset:offset + length]
+        
+        rows_by_author = {author_code: array("I", (new_rows[row] for row in rows)) for author_code, rows in storage.rows_by_author.items()}
+        self._storage = _Storage(columns, texts, bytearray(b"\x01") * len(columns["book_id"]), storage.rows_by_id.renumbered(new_rows, self._id_hash), storage.rows_by_key.renumbered(new_rows, self._key_hash), storage.rows_by_title.renumbered(new_rows, self._title_hash), rows_by_author)
+        self._tombstones = 0
+    
+    def get_unique_categories(self):
+        storage = self._storage
+        unique_categories = {self._code_values["category"][code] for code in set(compress(storage.columns["category"], storage.live))}
+        return [{"id": index, "category": category} for index, category in enumerate(unique_categories, start=1)]
+    
+    def lowest_stock(self, count):
+        if "ascending_stock" in self._sorted_views:
+            return super().lowest_stock(count)
+        storage = self._storage
+        stock, book_ids = storage.columns["stock"], storage.columns["book_id"]
+        rows = nsmallest(count, compress(range(len(storage.live)), storage.live), key=lambda row: (stock[row], book_ids[row]))
+        return [self._view(storage, row) for row in rows]
+    
+    def column(self, name):
+        '''
+        Returns the raw column for the given field. Rows of deleted books are still present in the column until it is compacted; use `live_rows` to filter them out. The columns of titles and descriptions hold the locations of the texts.
+        '''
+        
+        return self._storage.columns[name]
+    
+    def live_rows(self):
+        return self._storage.live
+    
+    def numpy_column(self, name):
+        '''
+        Returns a copy of a numeric or coded column as a NumPy array, or None if NumPy is not installed. Coded columns can be decoded with `code_values`.
+        '''
+        
+        if np is None:
+            return None
+        # The column is copied, since an array viewing the column's buffer would stop the column from growing when the next book is added.
+        column = self._storage.columns[name]
+        return np.array(column, dtype=np.dtype(column.typecode))
+    
+    def code_values(self, name):
+        return list(self._code_values[name])
@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import Future
+
+class StockUpdateQueue:
+    '''
+    This class lets many threads, e.g. point-of-sale workers, change stock without waiting for each other. The threads only put their stock changes in a queue, and a single writer thread applies them to the catalogue. The writer takes all the changes that have arrived since its last round and applies them under one acquisition of the catalogue's lock, but still one change at a time and in the order they were submitted, so one change being rejected never affects another.
+    
+    `submit` returns a `concurrent.futures.Future`, which gets the catalogue's error message as its result if the change was rejected, e.g. because it would make the stock negative, and None if it was applied. If an `on_rejected` callback is given, it is also called from the writer thread with the book ID, the stock change and the error message of every rejected change.
+    
+    Sales that must succeed or fail together, e.g. a basket with several books, should use `Catalogue.update_stocks` directly instead.
+    '''
+    
+    def __init__(self, catalogue, on_rejected=None):
+        self.catalogue = catalogue
+        self.on_rejected = on_rejected
+        self._pending = []
+        self._condition = threading.Condition()
+        self._submitted = 0
+        self._applied = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="stock-update-writer", daemon=True)
+        self._writer.start()
+    
+    def submit(self, book_id, stock_change):
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The stock update queue has been closed.")
+            self._pending.append((book_id, stock_change, future))
+            self._submitted += 1
+            self._condition.notify_all()
+        return future
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+                pending, self._pending = self._pending, []
+                submitted = self._submitted
+            
+            with self.catalogue._lock:
+                errors = [self._apply(book_id, stock_change) for book_id, stock_change, future in pending]
+            
+            # The results are handed out after the lock is released, so callbacks waiting on them cannot hold up other writers.
+            for (book_id, stock_change, future), error in zip(pending, errors):
+                if isinstance(error, Exception):
+                    future.set_exception(error)
+                    continue
+                future.set_result(error)
+                if error and self.on_rejected:
+                    self.on_rejected(book_id, stock_change, error)
+            
+            with self._condition:
+                self._applied = submitted
+                self._condition.notify_all()
+    
+    def _apply(self, book_id, stock_change):
+        try:
+            return self.catalogue.update_stock(book_id, stock_change)
+        except Exception as e:
+            return e
+    
+    def flush(self, timeout=None):
+        '''
+        Waits until every stock change submitted so far has been applied. Returns False if the timeout ran out first.
+        '''
+        
+        with self._condition:
+            target = self._submitted
+            return self._condition.wait_for(lambda: self._applied >= target, timeout)
+    
+    def close(self):
+        '''
+        Applies the remaining stock changes and stops the writer thread.
+        '''
+        
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
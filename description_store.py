@@ -0,0 +1,55 @@
+import mmap
+import os
+import threading
+
+class DescriptionStore:
+    '''
+    This class keeps long texts, such as book descriptions, in an append-only file instead of in memory. A text is written once with `append`, which returns its location in the file as a single integer, and is read back with `read` through a memory map. The operating system then only keeps the parts of the file that are actually read in memory.
+    
+    Texts are never overwritten. When a description is changed, the new text is appended and the old one is left in the file, so a store that sees many changes should be recreated from time to time. The file is emptied when the store is opened, since the locations are only kept in memory.
+    '''
+    
+    # A location is the offset of the text in the file shifted left by LENGTH_BITS, plus the length of the text in bytes.
+    LENGTH_BITS = 32
+    REMAP_AFTER_BYTES = 1 << 20
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w+b")
+        self._size = 0
+        self._map = None
+        self._lock = threading.Lock()
+    
+    def append(self, text):
+        data = text.encode("utf-8")
+        with self._lock:
+            location = (self._size << self.LENGTH_BITS) | len(data)
+            self._file.write(data)
+            self._size += len(data)
+            return location
+    
+    def read(self, location):
+        offset, length = location >> self.LENGTH_BITS, location & ((1 << self.LENGTH_BITS) - 1)
+        mapped_file = self._map
+        if mapped_file is not None and offset + length <= len(mapped_file):
+            return mapped_file[offset:offset + length].decode("utf-8")
+        return self._read_unmapped(offset, length)
+    
+    def _read_unmapped(self, offset, length):
+        # Texts appended after the file was last mapped are read from the file directly. The file is only mapped again once enough has been appended, so adding books does not remap it for every book.
+        with self._lock:
+            self._file.flush()
+            mapped_length = len(self._map) if self._map is not None else 0
+            if self._size - mapped_length < self.REMAP_AFTER_BYTES:
+                return os.pread(self._file.fileno(), length, offset).decode("utf-8")
+            self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+            return self._map[offset:offset + length].decode("utf-8")
+    
+    def close(self, remove=False):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+        if remove:
+            os.remove(self.path)
@@ -0,0 +1,229 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from classes import Factory
+
+def parse_chunk(header, numbered_rows, factory=None):
+    '''
+    Validates and converts a chunk of rows with `Factory.validate_books_data`. This function runs in the worker processes, so it only receives and returns plain lists. Returns the converted rows and a list of (row number, error message) tuples for the rows that could not be converted. If a `factory` is given, i.e. when the chunk is parsed in the importing process, the rows that could not be converted are reported to its listeners.
+    '''
+    
+    rows = []
+    row_numbers = []
+    bad_rows = []
+    for row_number, values in numbered_rows:
+        if not values:
+            continue
+        if len(values) != len(header):
+            bad_rows.append((row_number, f"Expected {len(header)} fields but found {len(values)}."))
+            continue
+        rows.append(dict(zip(header, values)))
+        row_numbers.append(row_number)
+    if factory is not None:
+        factory.report_bad_rows(bad_rows)
+    books_data, invalid_rows = Factory.validate_books_data(rows, row_numbers, factory)
+    bad_rows.extend(invalid_rows)
+    bad_rows.sort()
+    return books_data, bad_rows
+
+def read_csv_chunks(file, chunk_size):
+    '''
+    Streams a CSV file in chunks of at most `chunk_size` rows, so the whole file never has to be held in memory. Yields the header once and then lists of (row number, values) tuples. Row numbers count the header as row 1, matching what a spreadsheet shows.
+    '''
+    
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    yield [field.strip() for field in header]
+    
+    numbered_rows = enumerate(reader, start=2)
+    while True:
+        chunk = list(islice(numbered_rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def bulk_ingest(factory, filepath, chunk_size=10000, workers=1, progress_callback=None):
+    '''
+    Imports books from a CSV file in chunks. Each chunk is converted either in this process (`workers=1`) or in a pool of worker processes (`workers` > 1, or None for one worker per CPU), and the resulting books are added to the catalogue one chunk at a time through `Factory.create_new_books`.
+    
+    Rows that cannot be converted are collected in a bad-row report instead of stopping the import. If a `progress_callback` is given, it is called after every chunk with a dictionary describing the progress and throughput so far.
+    
+    Returns a report dictionary with the number of rows read, the number of books added, the rejected books and the bad rows.
+    '''
+    
+    report = {"rows": 0, "added": 0, "rejected": [], "bad_rows": [], "seconds": 0.0}
+    start_time = time.perf_counter()
+    
+    def handle_result(chunk_length, books_data, bad_rows):
+        rejected_books = factory.create_new_books(books_data)
+        report["rows"] += chunk_length
+        report["added"] += len(books_data) - len(rejected_books)
+        report["rejected"].extend(rejected_books)
+        report["bad_rows"].extend(bad_rows)
+        report["seconds"] = time.perf_counter() - start_time
+        if progress_callback:
+            progress_callback({
+                "rows": report["rows"],
+                "added": report["added"],
+                "bad_rows": len(report["bad_rows"]),
+                "seconds": report["seconds"],
+                "rows_per_second": report["rows"] / report["seconds"] if report["seconds"] else 0.0
+            })
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    with open(filepath, newline="") as file:
+        chunks = read_csv_chunks(file, chunk_size)
+        header = next(chunks, None)
+        if header is None:
+            return report
+        
+        if workers <= 1:
+            for chunk in chunks:
+                handle_result(len(chunk), *parse_chunk(header, chunk, factory))
+            return report
+        
+        # Only a few chunks are in flight at a time, so a huge file is never read into memory ahead of the workers. The bad rows found by the workers are reported to the factory listeners here, since the listeners live in this process.
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), executor.submit(parse_chunk, header, chunk)))
+                if len(pending) >= workers * 2:
+                    chunk_length, future = pending.popleft()
+                    books_data, bad_rows = future.result()
+                    factory.report_bad_rows(bad_rows)
+                    handle_result(chunk_length, books_data, bad_rows)
+            while pending:
+                chunk_length, future = pending.popleft()
+                books_data, bad_rows = future.result()
+                factory.report_bad_rows(bad_rows)
+                handle_result(chunk_length, books_data, bad_rows)
+    
+    return report
+
+def _row_hash(values):
+    return int.from_bytes(hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).digest(), "big")
+
+def load_sync_state(path):
+    '''
+    Reads the row hashes saved by `save_sync_state`. Returns an empty state if the file does not exist yet.
+    '''
+    
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return {(title, author, medium): row_hash for title, author, medium, row_hash in json.load(file)}
+
+def save_sync_state(path, state):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump([[*key, row_hash] for key, row_hash in state.items()], file)
+    os.replace(temporary_path, path)
+
+def sync_csv(factory, filepath, state, retire_missing=False, chunk_size=10000):
+    '''
+    Imports a data file that is delivered again and again, e.g. a nightly supplier feed, by only applying what has changed since the previous import. `state` maps each book (by title, author and medium) to a hash of its row in the previous import; it is updated in place and can be kept between runs with `load_sync_state` and `save_sync_state`.
+    
+    A row whose hash is unchanged is skipped without being validated or turned into a book. A changed row of an existing book updates the book in place: the stock through `update_stock`, so the change counts as goods received or sold, and any other changed fields through `update_book`. A row for a new book is added through `Factory.create_new_books`. If `retire_missing` is True, the books from the previous import that are missing from the file are deleted.
+    
+    Returns a summary with the number of rows read and of books inserted, updated, unchanged and removed, plus the rejected books and the rows that could not be read.
+    '''
+    
+    catalogue = factory.catalogue
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0, "rejected": [], "bad_rows": [], "seconds": 0.0}
+    start_time = time.perf_counter()
+    new_state = {}
+    seen_keys = set()
+    
+    def apply_chunk(rows, row_numbers, row_hashes):
+        books_data, bad_rows = factory.validate_books_data(rows, row_numbers, factory)
+        summary["bad_rows"].extend(bad_rows)
+        bad_row_numbers = {row_number for row_number, error in bad_rows}
+        valid_hashes = [row_hash for row_number, row_hash in zip(row_numbers, row_hashes) if row_number not in bad_row_numbers]
+        
+        new_books_data = []
+        for data, row_hash in zip(books_data, valid_hashes):
+            key = catalogue._unique_key(data["title"], data["author"], data["medium"])
+            book = catalogue.get_book_by_key(data["title"], data["author"], data["medium"])
+            if book is None:
+                new_books_data.append(data)
+                new_state[key] = row_hash
+                continue
+            
+            changes = {field: value for field, value in data.items() if field != "stock" and getattr(book, field) != value}
+            stock_change = data["stock"] - book.stock
+            error = catalogue.update_book(book.book_id, **changes) if changes else None
+            if not error and stock_change:
+                error = catalogue.update_stock(book.book_id, stock_change)
+            if error:
+                summary["rejected"].append(error)
+            elif changes or stock_change:
+                summary["updated"] += 1
+                new_state[key] = row_hash
+            else:
+                summary["unchanged"] += 1
+                new_state[key] = row_hash
+        
+        rejected_books = factory.create_new_books(new_books_data)
+        summary["inserted"] += len(new_books_data) - len(rejected_books)
+        summary["rejected"].extend(rejected_books)
+    
+    with open(filepath, newline="") as file:
+        chunks = read_csv_chunks(file, chunk_size)
+        header = next(chunks, None)
+        for chunk in chunks:
+            rows = []
+            row_numbers = []
+            row_hashes = []
+            for row_number, values in chunk:
+                if not values:
+                    continue
+                summary["rows"] += 1
+                if len(values) != len(header):
+                    bad_row = (row_number, f"Expected {len(header)} fields but found {len(values)}.")
+                    summary["bad_rows"].append(bad_row)
+                    factory.report_bad_rows([bad_row])
+                    continue
+                row = dict(zip(header, values))
+                key = catalogue._unique_key(row.get("title", "").strip(), row.get("author", "").strip(), row.get("medium", "").strip())
+                # The first row for a book wins; later rows for the same book in the same file are duplicates.
+                if key in seen_keys:
+                    message = f"The book {row.get('title', '').strip()} by {row.get('author', '').strip()} already exists in the catalogue."
+                    summary["rejected"].append(message)
+                    factory.report_duplicates([message])
+                    continue
+                seen_keys.add(key)
+                row_hash = _row_hash(values)
+                if state.get(key) == row_hash and catalogue.has_book(*key):
+                    summary["unchanged"] += 1
+                    new_state[key] = row_hash
+                    continue
+                rows.append(row)
+                row_numbers.append(row_number)
+                row_hashes.append(row_hash)
+            apply_chunk(rows, row_numbers, row_hashes)
+    
+    missing_keys = [key for key in state if key not in seen_keys]
+    if retire_missing:
+        missing_books = [catalogue.get_book_by_key(*key) for key in missing_keys]
+        results = catalogue.delete_books([book.book_id for book in missing_books if book is not None])
+        summary["removed"] = sum(result["deleted"] for result in results)
+    else:
+        new_state.update((key, state[key]) for key in missing_keys)
+    
+    state.clear()
+    state.update(new_state)
+    summary["seconds"] = time.perf_counter() - start_time
+    return summary
@@ -0,0 +1,194 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+from classes import FactoryListener
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+LATENCY_BUCKETS = [0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+FACTORY_OPERATIONS = ["create_new_book", "create_new_books", "validate_books_data", "_validate_book_data", "handle_new_book_input", "handle_new_books_input", "generate_book_from_data"]
+CATALOGUE_OPERATIONS = ["add_book", "add_books", "delete_book", "delete_books", "update_book", "update_stock", "find_books", "search_book", "find_books_by_keywords", "generate_stock_lists", "write_stock_list"]
+
+class Histogram:
+    '''
+    This class counts how many measurements fall into each of a fixed set of latency buckets, plus the total count and sum, in the same way as a Prometheus histogram.
+    '''
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+    
+    def as_dict(self):
+        cumulative_count = 0
+        cumulative_buckets = {}
+        for bound, bucket_count in zip(self.buckets + [float("inf")], self.bucket_counts):
+            cumulative_count += bucket_count
+            cumulative_buckets[str(bound)] = cumulative_count
+        return {"count": self.count, "sum": self.total, "buckets": cumulative_buckets}
+
+class Instrumentation(FactoryListener):
+    '''
+    This class measures what a `Factory` and a `Catalogue` spend their time on. When it is enabled, it counts the calls to each operation and records their latencies in histograms. It also counts rejected duplicates and failed validations, and reports the size of the catalogue and the memory use of the process. Failed validations are counted for the instrumented factory, including those of the CSV imports run with it.
+    
+    The instrumentation is switched on and off at runtime with `enable` and `disable`. It works by wrapping the methods of the given objects while enabled, so when it is disabled the objects run their normal, unwrapped methods and there is no overhead at all.
+    
+    A sampling profiler can be started with `start_profiler`. It looks at what the other threads are doing at regular intervals and counts the functions they are in, which shows where the time goes without slowing every call down.
+    
+    The measurements can be exported as a dictionary with `snapshot` or as Prometheus text with `prometheus_text`.
+    '''
+    
+    def __init__(self, factory=None, catalogue=None):
+        self.factory = factory
+        self.catalogue = catalogue
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._profiler_thread = None
+        self._profiler_stop = threading.Event()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.counters = Counter()
+            self.histograms = {}
+            self.profile_samples = Counter()
+    
+    def _targets(self):
+        if self.factory is not None:
+            yield self.factory, "factory", FACTORY_OPERATIONS
+        if self.catalogue is not None:
+            yield self.catalogue, "catalogue", CATALOGUE_OPERATIONS
+    
+    def enable(self):
+        if self.enabled:
+            return
+        for target, prefix, operations in self._targets():
+            for operation in operations:
+                if hasattr(target, operation):
+                    setattr(target, operation, self._wrap(getattr(target, operation), f"{prefix}_{operation.lstrip('_')}"))
+        if self.factory is not None:
+            self.factory.add_listener(self)
+        self.enabled = True
+    
+    def disable(self):
+        if not self.enabled:
+            return
+        for target, prefix, operations in self._targets():
+            for operation in operations:
+                target.__dict__.pop(operation, None)
+        if self.factory is not None:
+            self.factory.remove_listener(self)
+        self.enabled = False
+    
+    def _wrap(self, method, name):
+        histogram = self.histograms.setdefault(name, Histogram())
+        
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.counters[f"{name}_calls"] += 1
+                histogram.observe(elapsed)
+                if name == "catalogue_add_book" and result:
+                    self.counters["duplicates_rejected"] += 1
+            return result
+        
+        return wrapper
+    
+    def duplicates_rejected(self, messages):
+        # The factory rejects duplicates before they reach `Catalogue.add_book`, so they are counted when the factory reports them.
+        with self._lock:
+            self.counters["duplicates_rejected"] += len(messages)
+    
+    def validation_failed(self, bad_rows):
+        # Failed validations are reported by the factory itself, so the rows rejected by the CSV imports run with the factory are counted as well.
+        with self._lock:
+            self.counters["validation_failures"] += len(bad_rows)
+    
+    def start_profiler(self, interval=0.005, thread_ids=None):
+        '''
+        Starts sampling the stacks of the other threads (or only of `thread_ids`) every `interval` seconds.
+        '''
+        
+        if self._profiler_thread is not None:
+            return
+        self._profiler_stop.clear()
+        self._profiler_thread = threading.Thread(target=self._sample, args=(interval, thread_ids), name="sampling-profiler", daemon=True)
+        self._profiler_thread.start()
+    
+    def stop_profiler(self):
+        if self._profiler_thread is None:
+            return
+        self._profiler_stop.set()
+        self._profiler_thread.join()
+        self._profiler_thread = None
+    
+    def _sample(self, interval, thread_ids):
+        own_thread_id = threading.get_ident()
+        while not self._profiler_stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                code = frame.f_code
+                with self._lock:
+                    self.profile_samples[f"{code.co_filename}:{frame.f_lineno} {code.co_name}"] += 1
+    
+    def gauges(self):
+        gauges = {}
+        if self.catalogue is not None:
+            gauges["catalogue_books"] = self.catalogue._book_count()
+            gauges["catalogue_tombstones"] = self.catalogue._tombstones
+        if resource is not None:
+            # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            gauges["process_max_resident_memory_bytes"] = max_rss if sys.platform == "darwin" else max_rss * 1024
+        return gauges
+    
+    def snapshot(self, profile_limit=20):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "counters": dict(self.counters),
+                "latency_seconds": {name: histogram.as_dict() for name, histogram in self.histograms.items() if histogram.count},
+                "gauges": self.gauges(),
+                "profile": dict(self.profile_samples.most_common(profile_limit))
+            }
+    
+    def prometheus_text(self):
+        '''
+        Returns the counters, latency histograms and gauges in the Prometheus text exposition format.
+        '''
+        
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE bookstore_{name}_total counter")
+            lines.append(f"bookstore_{name}_total {value}")
+        if snapshot["latency_seconds"]:
+            lines.append("# TYPE bookstore_operation_latency_seconds histogram")
+        for name, histogram in sorted(snapshot["latency_seconds"].items()):
+            for bound, bucket_count in histogram["buckets"].items():
+                bound = "+Inf" if bound == "inf" else bound
+                lines.append(f'bookstore_operation_latency_seconds_bucket{{operation="{name}",le="{bound}"}} {bucket_count}')
+            lines.append(f'bookstore_operation_latency_seconds_sum{{operation="{name}"}} {histogram["sum"]}')
+            lines.append(f'bookstore_operation_latency_seconds_count{{operation="{name}"}} {histogram["count"]}')
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"# TYPE bookstore_{name} gauge")
+            lines.append(f"bookstore_{name} {value}")
+        return "\n".join(lines) + "\n"
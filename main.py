@@ -1,6 +1,11 @@
 
-import csv
+import os
+import sys
 from classes import Catalogue, Factory
+from ingest import load_sync_state, save_sync_state, sync_csv
+from persistence import CatalogueStore
+
+SYNC_STATE_PATH = os.path.join("catalogue_data", "books_data.sync.json")
 
 def display_menu():
     '''
@@ -16,16 +21,17 @@ def display_menu():
     print()
 
 
-def generate_books_from_csv(factory, filepath):
+def generate_books_from_csv(factory, filepath, sync_state_path=SYNC_STATE_PATH):
     '''
-    This function fetches data from the local file `books_data.csv` and passes this data on to the `factory`, where new book objects are then created and added to the `catalogue`.
+    This function fetches data from the local file `books_data.csv` and passes this data on to the `factory`, where new book objects are then created and added to the `catalogue`. The import is handled by `sync_csv` in `ingest.py`, which only applies the rows that have changed since the previous import: new books are added, and changed books are updated. It returns a summary with the number of books inserted, updated and unchanged, the books rejected by the `catalogue` and the rows that could not be read. The row hashes are kept in `sync_state_path` between runs; with None, every row is treated as new.
     The function is called from the add_new_book function, when the user selects the first option, 'Add books from a data file'. The purpose of this functionality is to allow the user to interact with the bookstore management system without having to manually add books to the system.
     '''
     
-    with open(filepath) as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            factory.generate_book_from_data(row)
+    sync_state = load_sync_state(sync_state_path) if sync_state_path else {}
+    import_report = sync_csv(factory, filepath, sync_state)
+    if sync_state_path:
+        save_sync_state(sync_state_path, sync_state)
+    return import_report
 
 def add_new_book(factory, catalogue):
     '''
@@ -41,8 +47,12 @@ def add_new_book(factory, catalogue):
         main_choice = input("Enter your choice (1-3): ").strip()
         
         if main_choice == "1":
-            generate_books_from_csv(factory, "books_data.csv")
-            print("25 books added.")
+            import_report = generate_books_from_csv(factory, "books_data.csv")
+            for rejection in import_report["rejected"]:
+                print(rejection)
+            for row_number, error in import_report["bad_rows"]:
+                print(f"Row {row_number} could not be read: {error}")
+            print(f"{import_report['inserted']} books added, {import_report['updated']} books updated and {import_report['unchanged']} books unchanged.")
             submenu_choice = input("Enter p to print the books or e to exit and return to the main menu: ").strip().lower()
             
             if submenu_choice == "p":
@@ -112,7 +122,7 @@ def add_new_book(factory, catalogue):
 
 def search_catalogue(catalogue):
     '''
-    This menu enables searches in the catalogue. Books can be found based on their ID, title, author, category and medium. The user selects a query type and enters a query value, which is then passed to the search_book method in the `catalogue`. Here, the queries are first validated, and then search result is returned.
+    This menu enables searches in the catalogue. Books can be found based on their ID, title, author, category, medium and audience, or by keywords in their title, author and description. The user selects a query type and enters a query value, which is then passed to the search_book method in the `catalogue`. Here, the queries are first validated, and then search result is returned.
     '''
     
     query_options = {
@@ -120,7 +130,8 @@ def search_catalogue(catalogue):
         "2": "title",
         "3": "author",
         "4": "category",
-        "5": "medium"
+        "5": "medium",
+        "6": "audience"
     }
     
     while True:
@@ -131,19 +142,30 @@ def search_catalogue(catalogue):
         print("3. Search by author")
         print("4. Search by category (fiction or non-fiction).")
         print("5. Search by medium (printed book, audiobook, or e-book).")
-        print("6. Exit and return to the main menu.")
+        print("6. Search by audience (children, young adults, or adults).")
+        print("7. Search by keywords in the title, author or description.")
+        print("8. Exit and return to the main menu.")
         print()
         
-        choice = input("Enter your choice (1-6): ").strip()
+        choice = input("Enter your choice (1-8): ").strip()
         print()
         
-        if choice == "6":
+        if choice == "8":
             print("Returning to main menu.")
             print()
             break
         
+        if choice == "7":
+            keywords = input("Enter the keywords that you want to search for (end a keyword with * to match the beginning of words):\n").strip()
+            print()
+            
+            search_result = catalogue.keyword_search(keywords)
+            print("Search result:")
+            print(search_result)
+            continue
+        
         if choice not in query_options:
-            print("Invalid choice. Please enter a number from 1 to 6.")
+            print("Invalid choice. Please enter a number from 1 to 8.")
             print()
         
         query_type = query_options[choice]
@@ -169,7 +191,7 @@ def delete_book(catalogue):
 
 def get_reports(catalogue):
     '''
-    This menu allows you to generate sorted stock lists. You are asked to choose how you want the lists sorted. Your choice is then passed to the generate_stock_lists method in the `catalogue` which returns a sorted list of stock items.
+    This menu allows you to generate sorted stock lists. You are asked to choose how you want the lists sorted. Your choice is then passed to the write_stock_list method in the `catalogue`, which prints the sorted list of stock items one book at a time.
     '''
     
     sorting_options = {
@@ -207,17 +229,21 @@ def get_reports(catalogue):
             
         sorting_choice = sorting_options[choice]
         
-        stock = catalogue.generate_stock_lists(sorting_choice)
-        print(stock)
+        validation_error = catalogue.write_stock_list(sorting_choice, sys.stdout)
+        if validation_error:
+            print(validation_error)
         print()
 
 def main():
     '''
     This function handles the functionality of the main menu. The menu runs in a loop untill the user chooses to exit.
+    The catalogue is loaded from the folder `catalogue_data` when the program starts, and all changes are saved there, so the catalogue is kept between runs.
     '''
     
     catalogue = Catalogue()
     factory = Factory(catalogue)
+    store = CatalogueStore("catalogue_data")
+    store.open(catalogue, factory)
     
     while True:
         display_menu()
@@ -233,6 +259,7 @@ def main():
         elif choice == "4":
             get_reports(catalogue)
         elif choice == "5":
+            store.close()
             print("Exiting the program. Goodbye!")
             break
         else:
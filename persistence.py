@@ -0,0 +1,238 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from classes import Book, CatalogueListener, Factory
+
+SNAPSHOT_MAGIC = b"BOOKSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIQQQI")
+
+NUMERIC_COLUMNS = {"book_id": "q", "size": "q", "stock": "q", "purchase_price": "d", "selling_price": "d"}
+CODED_COLUMNS = ["category", "medium", "audience"]
+TEXT_COLUMNS = ["title", "author", "description"]
+
+def _book_data(book):
+    return {field: getattr(book, field) for field in Book.FIELDS}
+
+def _build_book(book_id, data):
+    book_class = Factory.BOOK_CLASSES.get(str(data["medium"]).lower(), Book)
+    return book_class(book_id, **data)
+
+def write_snapshot(path, books, next_book_id, journal_sequence):
+    '''
+    Writes the books to a binary snapshot file. Every field is stored as one contiguous column: numbers as raw arrays, category, medium and audience as small codes, and text as a UTF-8 blob with an array of offsets. The file is written to a temporary file first and then moved into place, so a crash never leaves a half-written snapshot behind.
+    '''
+    
+    books = list(books)
+    sections = {}
+    for name, typecode in NUMERIC_COLUMNS.items():
+        sections[name] = array(typecode, (getattr(book, name) for book in books))
+    
+    code_values = {}
+    for name in CODED_COLUMNS:
+        codes = {}
+        sections[name] = array("H", (codes.setdefault(getattr(book, name), len(codes)) for book in books))
+        code_values[name] = list(codes)
+    
+    for name in TEXT_COLUMNS:
+        encoded_values = [str(getattr(book, name)).encode("utf-8") for book in books]
+        offsets = array("q", [0])
+        for value in encoded_values:
+            offsets.append(offsets[-1] + len(value))
+        sections[f"{name}_offsets"] = offsets
+        sections[name] = b"".join(encoded_values)
+    
+    # Section offsets are relative to the start of the data, which follows the table of contents and is aligned to 8 bytes.
+    contents = {"columns": {}, "codes": code_values}
+    offset = 0
+    for name, data in sections.items():
+        offset += -offset % 8
+        length = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        contents["columns"][name] = [offset, length, data.typecode if isinstance(data, array) else "blob"]
+        offset += length
+    contents_bytes = json.dumps(contents).encode("utf-8")
+    data_start = SNAPSHOT_HEADER.size + len(contents_bytes)
+    data_start += -data_start % 8
+    
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(books), next_book_id, journal_sequence, len(contents_bytes)))
+        file.write(contents_bytes)
+        for name, data in sections.items():
+            file.write(b"\0" * (data_start + contents["columns"][name][0] - file.tell()))
+            file.write(data.tobytes() if isinstance(data, array) else data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+def read_snapshot(path):
+    '''
+    Reads a snapshot written by `write_snapshot` through a memory map. The columns are copied directly into arrays, so no rows have to be parsed. Returns the list of books, the next book ID and the journal sequence number the snapshot includes.
+    '''
+    
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+        magic, version, book_count, next_book_id, journal_sequence, contents_length = SNAPSHOT_HEADER.unpack_from(mapped_file, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"The file {path} is not a supported catalogue snapshot.")
+        contents = json.loads(mapped_file[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + contents_length])
+        data_start = SNAPSHOT_HEADER.size + contents_length
+        data_start += -data_start % 8
+        
+        columns = {}
+        for name, (offset, length, typecode) in contents["columns"].items():
+            offset += data_start
+            if typecode == "blob":
+                columns[name] = mapped_file[offset:offset + length]
+            else:
+                columns[name] = array(typecode)
+                columns[name].frombytes(mapped_file[offset:offset + length])
+    
+    for name in CODED_COLUMNS:
+        code_values = contents["codes"][name]
+        columns[name] = [code_values[code] for code in columns[name]]
+    for name in TEXT_COLUMNS:
+        blob, offsets = columns[name], columns.pop(f"{name}_offsets")
+        columns[name] = [blob[offsets[row]:offsets[row + 1]].decode("utf-8") for row in range(book_count)]
+    
+    books = []
+    for row in range(book_count):
+        books.append(_build_book(columns["book_id"][row], {field: columns[field][row] for field in Book.FIELDS}))
+    return books, next_book_id, journal_sequence
+
+class CatalogueStore(CatalogueListener):
+    '''
+    This class saves a catalogue to disk, so it survives a restart. The catalogue is stored as a binary snapshot (see `write_snapshot`) plus a journal, which is an append-only file with one line per change made after the snapshot was written: added, updated and deleted books and stock changes. A stock transaction of several books, see `Catalogue.update_stocks`, is written as a single line, so it is replayed either in full or not at all.
+    
+    When the store is opened, the snapshot is loaded and only the journal entries written after it are replayed. Every journal entry has a sequence number, and the snapshot records the last sequence number it includes, so an entry is never applied twice. A half-written entry at the end of the journal, e.g. after a crash, is ignored and cut off. Once the journal has `compact_after` entries, a new snapshot is written and the journal is emptied.
+    '''
+    
+    SNAPSHOT_NAME = "catalogue.snapshot"
+    JOURNAL_NAME = "catalogue.journal"
+    
+    def __init__(self, directory, compact_after=10000, sync=False):
+        self.directory = directory
+        self.compact_after = compact_after
+        self.sync = sync
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_NAME)
+        self.journal_path = os.path.join(directory, self.JOURNAL_NAME)
+        self.catalogue = None
+        self.factory = None
+        self._journal = None
+        self._journal_entries = 0
+        self._sequence = 0
+    
+    def open(self, catalogue, factory):
+        '''
+        Loads the saved catalogue into the given (empty) `catalogue`, restores `factory.next_book_id`, and starts journaling all further changes. Returns a dictionary with the number of books loaded from the snapshot and the number of journal entries replayed.
+        '''
+        
+        os.makedirs(self.directory, exist_ok=True)
+        self.catalogue = catalogue
+        self.factory = factory
+        
+        snapshot_books = 0
+        next_book_id = factory.next_book_id
+        if os.path.exists(self.snapshot_path):
+            books, snapshot_next_book_id, self._sequence = read_snapshot(self.snapshot_path)
+            catalogue.load_books(books)
+            snapshot_books = len(books)
+            next_book_id = max(next_book_id, snapshot_next_book_id)
+        
+        replayed_entries, highest_book_id = self._replay_journal()
+        factory.next_book_id = max(next_book_id, highest_book_id + 1)
+        
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        catalogue.add_listener(self)
+        return {"snapshot_books": snapshot_books, "journal_entries": replayed_entries}
+    
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return 0, 0
+        
+        replayed_entries = 0
+        highest_book_id = 0
+        valid_length = 0
+        with open(self.journal_path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                valid_length += len(line)
+                self._journal_entries += 1
+                if entry["sequence"] <= self._sequence:
+                    continue
+                self._sequence = entry["sequence"]
+                self._apply_entry(entry)
+                replayed_entries += 1
+                if entry["operation"] == "add":
+                    highest_book_id = max(highest_book_id, entry["book_id"])
+        
+        if valid_length < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(valid_length)
+        return replayed_entries, highest_book_id
+    
+    def _apply_entry(self, entry):
+        operation = entry["operation"]
+        if operation == "add":
+            self.catalogue.add_book(_build_book(entry["book_id"], entry["book"]))
+        elif operation == "delete":
+            self.catalogue.delete_book(entry["book_id"])
+        elif operation == "update":
+            self.catalogue.update_book(entry["book_id"], **entry["changes"])
+        elif operation == "stock":
+            self.catalogue.update_stock(entry["book_id"], entry["stock_change"])
+        elif operation == "stocks":
+            self.catalogue.update_stocks({book_id: stock_change for book_id, stock_change in entry["stock_changes"]})
+    
+    def _write_entry(self, entry):
+        self._sequence += 1
+        entry["sequence"] = self._sequence
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+        if self.sync:
+            os.fsync(self._journal.fileno())
+        self._journal_entries += 1
+        if self._journal_entries >= self.compact_after:
+            self.checkpoint()
+    
+    def book_added(self, book):
+        self._write_entry({"operation": "add", "book_id": book.book_id, "book": _book_data(book)})
+    
+    def book_deleted(self, book):
+        self._write_entry({"operation": "delete", "book_id": book.book_id})
+    
+    def book_updated(self, book, old_values):
+        self._write_entry({"operation": "update", "book_id": book.book_id, "changes": {attribute: getattr(book, attribute) for attribute in old_values}})
+    
+    def stock_updated(self, book, stock_change):
+        self._write_entry({"operation": "stock", "book_id": book.book_id, "stock_change": stock_change})
+    
+    def stocks_updated(self, stock_changes):
+        # A transaction is written as one entry, so a crash can never leave only part of it in the journal.
+        self._write_entry({"operation": "stocks", "stock_changes": [[book.book_id, stock_change] for book, stock_change in stock_changes]})
+    
+    def checkpoint(self):
+        '''
+        Writes a new snapshot of the whole catalogue and empties the journal.
+        '''
+        
+        write_snapshot(self.snapshot_path, self.catalogue.books, self.factory.next_book_id, self._sequence)
+        self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._journal_entries = 0
+    
+    def close(self, checkpoint=True):
+        if self._journal is None:
+            return
+        if checkpoint:
+            self.checkpoint()
+        self.catalogue.remove_listener(self)
+        self._journal.close()
+        self._journal = None
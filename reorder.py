@@ -0,0 +1,114 @@
+from classes import CatalogueListener, SortedIndex
+
+def _stock_key(book):
+    return book.stock
+
+class ReorderMonitor(CatalogueListener):
+    '''
+    This class keeps track of which books are running low, so replenishment can run continuously instead of by sorting the whole catalogue. It keeps the books sorted by stock, both in total and for each category and medium, and updates the sorted views one book at a time as books are added and deleted and as their stock changes.
+    
+    Every book has a reorder point: the default reorder point, or a point set for the book with `set_reorder_point`. When the stock of a book drops below its reorder point, the callbacks subscribed with `subscribe` are called with the book and the reorder point. A callback can be limited to a category and/or a medium. The callbacks are called from the thread that changed the stock, while the catalogue's lock is held, so they should be quick, e.g. put the book in a queue.
+    '''
+    
+    def __init__(self, catalogue, default_reorder_point=5):
+        self.catalogue = catalogue
+        self.default_reorder_point = default_reorder_point
+        self._reorder_points = {}
+        self._subscriptions = []
+        self._views = {}
+        with catalogue._lock:
+            books_by_view = {}
+            for book in catalogue.books:
+                for view_key in self._view_keys(book):
+                    books_by_view.setdefault(view_key, []).append(book)
+            for view_key, books in books_by_view.items():
+                self._views[view_key] = SortedIndex(_stock_key)
+                self._views[view_key].add_many(books)
+            catalogue.add_listener(self)
+    
+    def close(self):
+        self.catalogue.remove_listener(self)
+    
+    @staticmethod
+    def _normalize(value):
+        return None if value is None else str(value).strip().lower()
+    
+    def _view_keys(self, book, old_values=None):
+        '''
+        Returns the keys of the sorted views a book belongs to: all books, its category, its medium, and its category and medium together. `old_values` overrides the book's current category or medium.
+        '''
+        
+        old_values = old_values or {}
+        category = self._normalize(old_values.get("category", book.category))
+        medium = self._normalize(old_values.get("medium", book.medium))
+        return [(None, None), (category, None), (None, medium), (category, medium)]
+    
+    def set_reorder_point(self, book_id, reorder_point):
+        self._reorder_points[book_id] = reorder_point
+    
+    def get_reorder_point(self, book_id):
+        return self._reorder_points.get(book_id, self.default_reorder_point)
+    
+    def subscribe(self, callback, category=None, medium=None):
+        self._subscriptions.append((callback, self._normalize(category), self._normalize(medium)))
+    
+    def unsubscribe(self, callback):
+        self._subscriptions = [subscription for subscription in self._subscriptions if subscription[0] is not callback]
+    
+    def lowest_stock(self, count, category=None, medium=None):
+        '''
+        Returns the `count` books with the lowest stock, optionally only within a category and/or a medium. The books are read from the front of a sorted view, so the time depends on `count` and not on the size of the catalogue.
+        '''
+        
+        view = self._views.get((self._normalize(category), self._normalize(medium)))
+        return list(view.iterate(0, count)) if view is not None else []
+    
+    def books_to_reorder(self, category=None, medium=None):
+        '''
+        Returns the books whose stock is below their reorder point, lowest stock first, optionally only within a category and/or a medium. Only the front of the sorted view is read, up to the highest reorder point in use.
+        '''
+        
+        view = self._views.get((self._normalize(category), self._normalize(medium)))
+        if view is None:
+            return []
+        highest_reorder_point = max([self.default_reorder_point, *self._reorder_points.values()])
+        start, stop = view.range_positions(high=highest_reorder_point, include_high=False)
+        return [book for book in view.iterate(start, stop - start) if book.stock < self.get_reorder_point(book.book_id)]
+    
+    def _add(self, book):
+        for view_key in self._view_keys(book):
+            self._views.setdefault(view_key, SortedIndex(_stock_key)).add(book)
+    
+    def _remove(self, book, old_values=None, old_stock=None):
+        for view_key in self._view_keys(book, old_values):
+            self._views[view_key].remove(book, old_stock)
+    
+    def _check_reorder_point(self, book, old_stock):
+        reorder_point = self.get_reorder_point(book.book_id)
+        if not old_stock >= reorder_point > book.stock:
+            return
+        category, medium = self._normalize(book.category), self._normalize(book.medium)
+        for callback, subscribed_category, subscribed_medium in self._subscriptions:
+            if subscribed_category in (None, category) and subscribed_medium in (None, medium):
+                callback(book, reorder_point)
+    
+    def book_added(self, book):
+        self._add(book)
+    
+    def book_deleted(self, book):
+        self._remove(book)
+        self._reorder_points.pop(book.book_id, None)
+    
+    def book_updated(self, book, old_values):
+        if not {"stock", "category", "medium"} & set(old_values):
+            return
+        old_stock = old_values.get("stock", book.stock)
+        self._remove(book, old_values, old_stock)
+        self._add(book)
+        self._check_reorder_point(book, old_stock)
+    
+    def stock_updated(self, book, stock_change):
+        old_stock = book.stock - stock_change
+        self._remove(book, old_stock=old_stock)
+        self._add(book)
+        self._check_reorder_point(book, old_stock)
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+
+from classes import Book, Catalogue, Factory
+from persistence import CatalogueStore
+
+REPORT_CHUNK_SIZE = 500
+
+def _book_to_dict(book):
+    book_data = {"book_id": book.book_id}
+    book_data.update({field: getattr(book, field) for field in Book.FIELDS})
+    return book_data
+
+def _error_response(error):
+    # A request with missing or malformed fields, e.g. a stock change that is not a number, is answered with an error instead of closing the connection.
+    if isinstance(error, (KeyError, TypeError, ValueError, AttributeError)):
+        return {"ok": False, "error": f"Missing or invalid request field: {str(error)}"}
+    return {"ok": False, "error": f"The request failed: {type(error).__name__}: {str(error)}"}
+
+class CatalogueService:
+    '''
+    This class makes the `Factory` and `Catalogue` available over a local network socket, so several clients, e.g. a web shop and warehouse scanners, can use the same catalogue at once.
+    
+    The protocol is line based: every request is one line of JSON with an `operation` and its arguments, and every response is one line of JSON. A request may include an `id`, which is copied to its response. A client may send many requests without waiting for the responses (pipelining); the responses are always sent in the same order as the requests.
+    
+    Operations: `add`, `bulk_add`, `search`, `keyword_search`, `query`, `delete`, `bulk_delete`, `adjust_stock`, `stock_report` and `batch`, which runs a list of requests and returns a list of responses. A stock report is streamed as a number of `books` lines followed by a final line with `"done": true`, so a long report never has to be built as one response.
+    '''
+    
+    def __init__(self, factory, catalogue):
+        self.factory = factory
+        self.catalogue = catalogue
+        self.operations = {
+            "add": self._add,
+            "bulk_add": self._bulk_add,
+            "search": self._search,
+            "keyword_search": self._keyword_search,
+            "query": self._query,
+            "delete": self._delete,
+            "bulk_delete": self._bulk_delete,
+            "adjust_stock": self._adjust_stock,
+            "batch": self._batch
+        }
+    
+    def handle_request(self, request):
+        '''
+        Runs a single request, except for stock reports, and returns the response as a dictionary. A request that fails is answered with an error response, so one bad request never closes the connection.
+        '''
+        
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Each request must be a JSON object."}
+        
+        operation = self.operations.get(request.get("operation"))
+        if operation is None:
+            return {"ok": False, "error": f"Invalid operation: {request.get('operation')}. Please provide one of the following operations: {', '.join(self.operations)}, or stock_report."}
+        
+        try:
+            response = operation(request)
+        except Exception as e:
+            response = _error_response(e)
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+    
+    def _add(self, request):
+        error = self.factory.handle_new_book_input(**request["book"])
+        return {"ok": not error, "error": error}
+    
+    def _bulk_add(self, request):
+        # The books are validated as one batch, and the valid books are added to the catalogue in one call. The rows of the report count from 1, the indexes of the request from 0.
+        report = self.factory.handle_new_books_input(request["books"])
+        errors = [{"index": row_number - 1, "error": error} for row_number, error in report["bad_rows"]]
+        return {"ok": not errors and not report["rejected"], "added": report["added"], "errors": errors, "rejected": report["rejected"]}
+    
+    def _search(self, request):
+        error, books = self.catalogue.find_books(request["query_type"], request["query_value"])
+        return {"ok": not error, "error": error, "books": [_book_to_dict(book) for book in books]}
+    
+    def _keyword_search(self, request):
+        error, books = self.catalogue.find_books_by_keywords(request["keywords"], request.get("limit", 10))
+        return {"ok": not error, "error": error, "books": [_book_to_dict(book) for book in books]}
+    
+    def _query(self, request):
+        error, books = self.catalogue.query_books(request["predicates"], request.get("sorting_choice"), request.get("limit"))
+        return {"ok": not error, "error": error, "books": [_book_to_dict(book) for book in books]}
+    
+    def _delete(self, request):
+        result = self.catalogue.delete_books([request["book_id"]])[0]
+        return {"ok": result["deleted"], "message": result["message"]}
+    
+    def _bulk_delete(self, request):
+        results = self.catalogue.delete_books(request["book_ids"])
+        return {"ok": all(result["deleted"] for result in results), "results": results}
+    
+    def _adjust_stock(self, request):
+        if "stock_changes" in request:
+            stock_changes = {int(book_id): int(stock_change) for book_id, stock_change in request["stock_changes"].items()}
+            error = self.catalogue.update_stocks(stock_changes)
+        else:
+            error = self.catalogue.update_stock(int(request["book_id"]), int(request["stock_change"]))
+        return {"ok": not error, "error": error}
+    
+    def _batch(self, request):
+        return {"ok": True, "results": [self.handle_request(batch_request) for batch_request in request["requests"]]}
+    
+    async def _stream_stock_report(self, request, writer):
+        error, books = self.catalogue.iterate_stock_list(request.get("sorting_choice"), request.get("offset", 0), request.get("limit"))
+        response_id = {"id": request["id"]} if "id" in request else {}
+        if error:
+            writer.write((json.dumps({"ok": False, "error": error, **response_id}) + "\n").encode("utf-8"))
+            return
+        
+        # The books are taken from a copy of the sorted view, so the stock changes made by other clients while the report is sent cannot disturb it.
+        count = 0
+        chunk = []
+        for book in books:
+            chunk.append(_book_to_dict(book))
+            if len(chunk) >= REPORT_CHUNK_SIZE:
+                writer.write((json.dumps({"books": chunk, **response_id}) + "\n").encode("utf-8"))
+                count += len(chunk)
+                chunk = []
+                await writer.drain()
+        count += len(chunk)
+        if chunk:
+            writer.write((json.dumps({"books": chunk, **response_id}) + "\n").encode("utf-8"))
+        writer.write((json.dumps({"ok": True, "done": True, "count": count, **response_id}) + "\n").encode("utf-8"))
+    
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    writer.write((json.dumps({"ok": False, "error": f"Invalid JSON: {str(e)}"}) + "\n").encode("utf-8"))
+                    continue
+                
+                if isinstance(request, dict) and request.get("operation") == "stock_report":
+                    try:
+                        await self._stream_stock_report(request, writer)
+                    except ConnectionError:
+                        raise
+                    except Exception as e:
+                        response_id = {"id": request["id"]} if "id" in request else {}
+                        writer.write((json.dumps({**_error_response(e), **response_id}) + "\n").encode("utf-8"))
+                else:
+                    writer.write((json.dumps(self.handle_request(request)) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the bookstore catalogue over a line-based JSON protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", default="catalogue_data", help="The folder where the catalogue is saved.")
+    arguments = parser.parse_args()
+    
+    catalogue = Catalogue()
+    factory = Factory(catalogue)
+    store = CatalogueStore(arguments.data)
+    store.open(catalogue, factory)
+    service = CatalogueService(factory, catalogue)
+    try:
+        asyncio.run(service.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import os
+from heapq import merge, nlargest, nsmallest
+from itertools import chain, islice
+from multiprocessing import Pipe, Process
+
+from classes import Catalogue
+
+def _delete_books(catalogue, book_ids):
+    books = [catalogue.get_book(book_id) for book_id in book_ids]
+    results = catalogue.delete_books(book_ids)
+    return [(result, book if result["deleted"] else None) for result, book in zip(results, books)]
+
+def _update_book(catalogue, book_id, changes):
+    book = catalogue.get_book(book_id)
+    old_values = {attribute: getattr(book, attribute) for attribute in changes} if book is not None else {}
+    return catalogue.update_book(book_id, **changes), book, old_values
+
+def _update_stocks(catalogue, stock_changes):
+    validation_error = catalogue.update_stocks(stock_changes)
+    return validation_error, [catalogue.get_book(book_id) for book_id in stock_changes]
+
+def _find_books_by_keywords(catalogue, keywords, limit):
+    catalogue._index_loaded_text()
+    return [(score, catalogue.get_book(book_id)) for book_id, score in catalogue._text_index.search(keywords, limit)]
+
+# The operations a shard can run on its own catalogue. Each returns plain data or copies of books, which are sent back to the coordinator.
+SHARD_OPERATIONS = {
+    "add_books": lambda catalogue, books: catalogue.load_books(books),
+    "books": lambda catalogue: catalogue.books,
+    "get_book": lambda catalogue, book_id: catalogue.get_book(book_id),
+    "delete_books": _delete_books,
+    "update_book": _update_book,
+    "update_stock": lambda catalogue, book_id, stock_change: (catalogue.update_stock(book_id, stock_change), catalogue.get_book(book_id)),
+    "check_stock_changes": lambda catalogue, stock_changes: catalogue._check_stock_changes(stock_changes),
+    "update_stocks": _update_stocks,
+    "categories": lambda catalogue: {book.category for book in catalogue.books},
+    "find_books": lambda catalogue, query_type, query_value: catalogue.find_books(query_type, query_value)[1],
+    "find_books_by_keywords": _find_books_by_keywords,
+    "query_books": lambda catalogue, predicates, sorting_choice, limit: list(catalogue.query_books(predicates, sorting_choice, limit)[1]),
+    "stock_list": lambda catalogue, sorting_choice, stop: list(catalogue.iterate_stock_list(sorting_choice, 0, stop)[1]),
+    "lowest_stock": lambda catalogue, count: catalogue.lowest_stock(count)
+}
+
+def _run_shard(connection):
+    '''
+    The main loop of a shard process. It keeps its own `Catalogue` and runs the operations it receives from the coordinator one at a time, until it receives None.
+    '''
+    
+    catalogue = Catalogue()
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        operation, args = message
+        try:
+            connection.send((None, SHARD_OPERATIONS[operation](catalogue, *args)))
+        except Exception as e:
+            connection.send((f"{type(e).__name__}: {str(e)}", None))
+    connection.close()
+
+class ShardedCatalogue(Catalogue):
+    '''
+    This class spreads a catalogue over several worker processes (shards), so adding, indexing and searching books can use more than one CPU core and more memory than a single process has. Each shard keeps an ordinary `Catalogue` with its own indexes, and this class acts as the coordinator that the `Factory`, the menu and the other modules talk to.
+    
+    Books are placed by their ID: runs of `block_size` consecutive IDs go to the same shard, and the runs are dealt out to the shards in turn. A shard can therefore be found from the ID alone, and a batch numbered with `Factory.allocate_id_block` is split into a few large runs. The duplicate check is kept in the coordinator, so it covers all shards.
+    
+    Searches and stock lists are scatter-gather operations: the request is sent to every shard at once, and the sorted results of the shards are merged. Keyword search ranks the books with the word statistics of each shard, which is close to, but not exactly, the ranking of a single catalogue.
+    
+    The books returned by this class are copies sent from the shards, so they must be changed through the catalogue and not by setting their attributes. The copies belong to this class, so `update_stock` on a returned book is sent on to the book's shard. Listeners are told about changes with such copies. Call `close` to stop the shard processes.
+    '''
+    
+    def __init__(self, shard_count=None, block_size=1024):
+        super().__init__()
+        self.shard_count = shard_count or os.cpu_count() or 1
+        self.block_size = block_size
+        self._connections = []
+        self._processes = []
+        for shard in range(self.shard_count):
+            connection, shard_connection = Pipe()
+            process = Process(target=_run_shard, args=(shard_connection,), name=f"catalogue-shard-{shard}", daemon=True)
+            process.start()
+            shard_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._id_by_key = {}
+    
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.send(None)
+                connection.close()
+            for process in self._processes:
+                process.join()
+            self._connections = []
+            self._processes = []
+    
+    def shard_for(self, book_id):
+        return (book_id - 1) // self.block_size % self.shard_count
+    
+    def _call(self, shard, operation, *args):
+        return self._call_shards({shard: args}, operation)[shard]
+    
+    def _call_shards(self, shard_args, operation):
+        '''
+        Sends an operation to several shards at once and then collects their results, so the shards work in parallel. `shard_args` maps each shard to the arguments for its call. Returns a dictionary with the result from each shard.
+        '''
+        
+        with self._lock:
+            for shard, args in shard_args.items():
+                self._connections[shard].send((operation, args))
+            results = {}
+            errors = []
+            for shard in shard_args:
+                error, results[shard] = self._connections[shard].recv()
+                if error:
+                    errors.append(f"Shard {shard}: {error}")
+            if errors:
+                raise RuntimeError(" ".join(errors))
+            return results
+    
+    def _call_all(self, operation, *args):
+        return list(self._call_shards({shard: args for shard in range(self.shard_count)}, operation).values())
+    
+    def _attach(self, books):
+        # A copy sent from a shard arrives without a catalogue. Attaching it to the coordinator makes `Book.update_stock` change the book in its shard instead of only the copy.
+        for book in books:
+            if book is not None:
+                book._catalogue = self
+        return books
+    
+    @property
+    def books(self):
+        return self._attach(sorted((book for books in self._call_all("books") for book in books), key=lambda book: book.book_id))
+    
+    def has_book(self, title, author, medium):
+        return self._unique_key(title, author, medium) in self._id_by_key
+    
+    def get_book(self, book_id):
+        return self._attach([self._call(self.shard_for(book_id), "get_book", book_id)])[0]
+    
+    def get_book_by_key(self, title, author, medium):
+        book_id = self._id_by_key.get(self._unique_key(title, author, medium))
+        return None if book_id is None else self.get_book(book_id)
+    
+    def add_book(self, new_book):
+        rejected_books = self.add_books([new_book])
+        return rejected_books[0] if rejected_books else None
+    
+    def add_books(self, new_books):
+        with self._lock:
+            rejected_books = []
+            books_by_shard = {}
+            for new_book in new_books:
+                key = self._unique_key(new_book.title, new_book.author, new_book.medium)
+                if key in self._id_by_key:
+                    rejected_books.append(f"The book {new_book.title} by {new_book.author} already exists in the catalogue.")
+                    continue
+                self._id_by_key[key] = new_book.book_id
+                books_by_shard.setdefault(self.shard_for(new_book.book_id), []).append(new_book)
+            
+            for shard_rejections in self._call_shards({shard: (books,) for shard, books in books_by_shard.items()}, "add_books").values():
+                rejected_books.extend(shard_rejections)
+            for books in books_by_shard.values():
+                for new_book in self._attach(books):
+                    for listener in self._listeners:
+                        listener.book_added(new_book)
+            return rejected_books
+    
+    def load_books(self, books):
+        # The shards already add every batch with `load_books`.
+        return self.add_books(books)
+    
+    def delete_book(self, book_id):
+        return self.delete_books([book_id])[0]["message"]
+    
+    def delete_books(self, book_ids):
+        with self._lock:
+            results = [None] * len(book_ids)
+            ids_by_shard = {}
+            for position, book_id in enumerate(book_ids):
+                try:
+                    ids_by_shard.setdefault(self.shard_for(int(book_id)), []).append((position, int(book_id)))
+                except (TypeError, ValueError):
+                    results[position] = {"book_id": book_id, "deleted": False, "message": f"Invalid book ID: {book_id}. Please provide an ID consisting of only numeric characters."}
+            
+            shard_results = self._call_shards({shard: ([book_id for position, book_id in ids],) for shard, ids in ids_by_shard.items()}, "delete_books")
+            for shard, ids in ids_by_shard.items():
+                for (position, book_id), (result, book) in zip(ids, shard_results[shard]):
+                    results[position] = dict(result, book_id=book_ids[position])
+                    if book is not None:
+                        del self._id_by_key[self._unique_key(book.title, book.author, book.medium)]
+                        for listener in self._listeners:
+                            listener.book_deleted(book)
+            return results
+    
+    def update_book(self, book_id, **changes):
+        with self._lock:
+            book = self.get_book(book_id)
+            if book is None:
+                return f"No book with the provided ID {book_id} was found in the catalogue."
+            
+            old_key = self._unique_key(book.title, book.author, book.medium)
+            new_key = self._unique_key(changes.get("title", book.title), changes.get("author", book.author), changes.get("medium", book.medium))
+            if new_key != old_key and new_key in self._id_by_key:
+                return f"The book {changes.get('title', book.title)} by {changes.get('author', book.author)} already exists in the catalogue."
+            
+            validation_error, book, old_values = self._call(self.shard_for(book_id), "update_book", book_id, changes)
+            if validation_error:
+                return validation_error
+            self._attach([book])
+            del self._id_by_key[old_key]
+            self._id_by_key[new_key] = book_id
+            for listener in self._listeners:
+                listener.book_updated(book, old_values)
+    
+    def update_stock(self, book_id, stock_change):
+        with self._lock:
+            validation_error, book = self._call(self.shard_for(book_id), "update_stock", book_id, stock_change)
+            if validation_error:
+                return validation_error
+            self._attach([book])
+            for listener in self._listeners:
+                listener.stock_updated(book, stock_change)
+    
+    def update_stocks(self, stock_changes):
+        '''
+        Changes the stock of several books as one transaction. All shards involved check their part first, and the changes are only made if every check passes. The coordinator's lock keeps other changes out in between.
+        '''
+        
+        with self._lock:
+            changes_by_shard = {}
+            for book_id, stock_change in stock_changes.items():
+                changes_by_shard.setdefault(self.shard_for(book_id), {})[book_id] = stock_change
+            
+            for validation_error in self._call_shards({shard: (changes,) for shard, changes in changes_by_shard.items()}, "check_stock_changes").values():
+                if validation_error:
+                    return validation_error
+            
+            changed_books = []
+            for validation_error, books in self._call_shards({shard: (changes,) for shard, changes in changes_by_shard.items()}, "update_stocks").values():
+                changed_books.extend((book, stock_changes[book.book_id]) for book in self._attach(books))
+            for listener in self._listeners:
+                listener.stocks_updated(changed_books)
+    
+    def get_unique_categories(self):
+        unique_categories = set().union(*self._call_all("categories"))
+        return [{"id": index, "category": category} for index, category in enumerate(unique_categories, start=1)]
+    
+    def find_books(self, query_type, query_value):
+        validation_error, validated_query_type, validated_query_value = self._validate_query(query_type, query_value)
+        if validation_error:
+            return validation_error, []
+        
+        if validated_query_type == "book_id":
+            book = self.get_book(int(validated_query_value))
+            return None, [book] if book is not None else []
+        
+        matching_books = self._call_all("find_books", validated_query_type, validated_query_value)
+        return None, self._attach(sorted((book for books in matching_books for book in books), key=lambda book: book.book_id))
+    
+    def find_books_by_keywords(self, keywords, limit=10):
+        keywords = str(keywords).strip()
+        if not keywords:
+            return "Please provide at least one keyword to search for.", []
+        
+        scored_books = [scored_book for scored_books in self._call_all("find_books_by_keywords", keywords, limit) for scored_book in scored_books]
+        return None, self._attach([book for score, book in nlargest(limit, scored_books, key=lambda scored_book: scored_book[0])])
+    
+    def query_books(self, predicates, sorting_choice=None, limit=None):
+        '''
+        Runs a compound query on every shard, each planned by the shard's own indexes, and merges the results. Sorted results are merged in order, and `limit` is applied both in each shard and to the merged result.
+        '''
+        
+        validation_error = self._validate_predicates(predicates)[0]
+        if not validation_error and sorting_choice is not None and sorting_choice not in self.SORTING_KEYS:
+            validation_error = f"Invalid sorting choice: {sorting_choice}. Please provide one of the following sorting choices: {', '.join(self.SORTING_KEYS)}."
+        validation_error = validation_error or self._validate_limit(limit)
+        if validation_error:
+            return validation_error, iter(())
+        
+        matching_books = [self._attach(books) for books in self._call_all("query_books", list(predicates), sorting_choice, limit)]
+        if sorting_choice is None:
+            return None, islice(chain(*matching_books), limit)
+        key_function = self.SORTING_KEYS[sorting_choice]
+        return None, islice(merge(*matching_books, key=lambda book: (key_function(book), book.book_id)), limit)
+    
+    def iterate_stock_list(self, sorting_choice, offset=0, limit=None):
+        '''
+        Returns a tuple of a validation error (or None) and an iterator over the books sorted by the sorting choice. Each shard returns its own sorted list, cut off after `offset` + `limit` books, and the lists are merged.
+        '''
+        
+        if sorting_choice not in self.SORTING_KEYS:
+            return f"Invalid sorting choice: {sorting_choice}. Please provide one of the following sorting choices: {', '.join(self.SORTING_KEYS)}.", iter(())
+        
+        stop = None if limit is None else offset + limit
+        key_function = self.SORTING_KEYS[sorting_choice]
+        sorted_lists = [self._attach(books) for books in self._call_all("stock_list", sorting_choice, stop)]
+        return None, islice(merge(*sorted_lists, key=lambda book: (key_function(book), book.book_id)), offset, stop)
+    
+    def lowest_stock(self, count):
+        lowest_books = [book for books in self._call_all("lowest_stock", count) for book in books]
+        return self._attach(nsmallest(count, lowest_books, key=lambda book: (book.stock, book.book_id)))
@@ -0,0 +1,8 @@
+def book_data(number, **changes):
+    '''
+    Returns the data of a valid printed book numbered `number`, with the stock set to `number`. Any field can be overridden with a keyword argument.
+    '''
+    
+    data = {"title": f"Title {number}", "author": f"Author {number}", "description": f"Description {number}", "category": "fiction", "medium": "printed", "audience": "adults", "size": 100, "purchase_price": 10.0, "selling_price": 20.0, "stock": number}
+    data.update(changes)
+    return data
@@ -0,0 +1,65 @@
+import unittest
+
+from analytics import InventoryAnalytics
+from classes import Catalogue, Factory
+from columnar import ColumnarCatalogue
+from helpers import book_data
+
+class InventoryAnalyticsTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.factory = Factory(self.catalogue)
+        self.add_books(self.factory)
+        self.analytics = InventoryAnalytics(self.catalogue)
+        self.addCleanup(self.analytics.close)
+    
+    @staticmethod
+    def add_books(factory):
+        report = factory.handle_new_books_input([
+            book_data(1, stock=10, purchase_price=5.0, selling_price=8.0),
+            book_data(2, stock=4, category="non-fiction", medium="audiobook")
+        ])
+        assert report["added"] == 2, report
+    
+    def test_totals_of_the_existing_stock(self):
+        totals = self.analytics.totals()
+        self.assertEqual((totals["titles"], totals["units"], totals["inventory_value"], totals["potential_revenue"]), (2, 14, 90.0, 160.0))
+        self.assertEqual((totals["margin"], totals["margin_percent"], totals["sell_through_percent"]), (70.0, 43.75, 0.0))
+    
+    def test_totals_follow_stock_changes_updates_and_deletes(self):
+        self.assertIsNone(self.catalogue.update_stock(1, -2))
+        self.assertIsNone(self.catalogue.update_stock(2, 3))
+        totals = self.analytics.totals()
+        self.assertEqual((totals["units"], totals["inventory_value"], totals["potential_revenue"], totals["margin"]), (15, 110.0, 204.0, 94.0))
+        self.assertEqual((totals["units_sold"], totals["units_received"], totals["sell_through_percent"]), (2, 3, 11.76))
+        
+        self.assertIsNone(self.catalogue.update_book(2, purchase_price=12.0))
+        self.assertEqual(self.analytics.totals()["inventory_value"], 124.0)
+        self.catalogue.delete_book(1)
+        totals = self.analytics.totals()
+        self.assertEqual((totals["titles"], totals["units"], totals["inventory_value"], totals["units_sold"]), (1, 7, 84.0, 2))
+    
+    def test_summary_by_group(self):
+        self.assertIsNone(self.catalogue.update_stock(1, -10))
+        self.catalogue.delete_book(1)
+        validation_error, summary = self.analytics.summary("medium")
+        self.assertIsNone(validation_error)
+        self.assertEqual(set(summary), {"Printed", "Audiobook"})
+        self.assertEqual((summary["Printed"]["titles"], summary["Printed"]["units_sold"], summary["Printed"]["sell_through_percent"]), (0, 10, 100.0))
+        self.assertEqual((summary["Audiobook"]["titles"], summary["Audiobook"]["inventory_value"]), (1, 40.0))
+        self.assertEqual({category: figures["titles"] for category, figures in self.analytics.summary("category")[1].items()}, {"Fiction": 0, "Non-fiction": 1})
+        self.assertIn("Invalid grouping", self.analytics.summary("author")[0])
+    
+    def test_recompute_keeps_the_units_sold_and_received(self):
+        self.assertIsNone(self.catalogue.update_stocks({1: -1, 2: 1}))
+        before = self.analytics.totals()
+        self.analytics.recompute()
+        self.assertEqual(self.analytics.totals(), before)
+    
+    def test_columnar_catalogue_gives_the_same_totals(self):
+        catalogue = ColumnarCatalogue()
+        self.add_books(Factory(catalogue))
+        analytics = InventoryAnalytics(catalogue)
+        self.addCleanup(analytics.close)
+        self.assertEqual(analytics.totals(), self.analytics.totals())
+        self.assertEqual(analytics.summary("audience"), self.analytics.summary("audience"))
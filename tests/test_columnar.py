@@ -0,0 +1,85 @@
+import gc
+import tracemalloc
+import unittest
+
+from classes import Catalogue, Factory
+from columnar import ColumnarCatalogue
+from helpers import book_data
+
+class ColumnarCatalogueTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = ColumnarCatalogue()
+        self.catalogue.COMPACTION_MIN_TOMBSTONES = 2
+        self.factory = Factory(self.catalogue)
+        self.assertEqual(self.factory.create_new_books([book_data(number, size=100 + number) for number in range(6)]), [])
+    
+    def test_deleted_view_does_not_alias_another_row_after_compaction(self):
+        deleted_view = self.catalogue.get_book(1)
+        self.catalogue.delete_book(1)
+        self.catalogue.delete_books([2, 3])
+        self.assertEqual(len(self.catalogue.column("book_id")), 3)
+        
+        with self.assertRaises(AttributeError):
+            deleted_view.title
+        with self.assertRaises(AttributeError):
+            deleted_view.stock = 99
+        self.assertEqual([book.stock for book in self.catalogue.books], [3, 4, 5])
+    
+    def test_remaining_views_follow_their_rows_through_compaction(self):
+        view = self.catalogue.get_book(6)
+        self.catalogue.delete_books([1, 2, 3, 4])
+        self.assertEqual((view.book_id, view.title, view.stock), (6, "Title 5", 5))
+        view.update_stock(-2)
+        self.assertEqual(self.catalogue.lowest_stock(1)[0].title, "Title 5")
+        self.assertEqual(self.catalogue.get_book(6).stock, 3)
+    
+    def test_numpy_column_is_a_copy(self):
+        stock = self.catalogue.numpy_column("stock")
+        if stock is None:
+            self.skipTest("NumPy is not installed")
+        self.assertEqual(self.factory.create_new_books([book_data(6, size=106)]), [])
+        self.assertEqual(len(stock), 6)
+        self.assertEqual(len(self.catalogue.numpy_column("stock")), 7)
+    
+    def test_views_are_created_when_books_are_read(self):
+        self.assertIsNot(self.catalogue.get_book(1), self.catalogue.get_book(1))
+        self.assertEqual([book.book_id for book in self.catalogue.find_books("title", "TITLE 2")[1]], [3])
+        self.assertEqual([book.book_id for book in self.catalogue.find_books("author", "author 4")[1]], [5])
+        self.assertEqual(len(self.catalogue.find_books("category", "Fiction")[1]), 6)
+        validation_error, books = self.catalogue.query_books([("medium", "=", "printed"), ("size", ">=", 104)], "descending_stock")
+        self.assertIsNone(validation_error)
+        self.assertEqual([book.book_id for book in books], [6, 5])
+        self.assertEqual([book.book_id for book in self.catalogue.find_books_by_keywords("description")[1]], [1, 2, 3, 4, 5, 6])
+    
+    def test_changed_texts_are_appended_and_dropped_by_compaction(self):
+        self.assertIsNone(self.catalogue.update_book(2, title="Nyt æøå", author="Author 0"))
+        self.assertIn("already exists", self.catalogue.update_book(3, title="nyt ÆØÅ", author="author 0"))
+        self.assertTrue(self.catalogue.has_book("NYT ÆØÅ", "author 0", "Printed"))
+        self.assertFalse(self.catalogue.has_book("Title 1", "Author 1", "printed"))
+        self.assertEqual([book.book_id for book in self.catalogue.find_books("author", "author 0")[1]], [1, 2])
+        self.assertEqual(self.catalogue.get_book_by_key("nyt æøå", "AUTHOR 0", "printed").title, "Nyt æøå")
+        
+        title_blob_size = len(self.catalogue._storage.texts["title"])
+        self.catalogue.delete_books([4, 5, 6])
+        self.assertLess(len(self.catalogue._storage.texts["title"]), title_blob_size)
+        self.assertEqual([book.title for book in self.catalogue.books], ["Title 0", "Nyt æøå", "Title 2"])
+        self.assertEqual([book.book_id for book in self.catalogue.find_books("title", "nyt æøå")[1]], [2])
+
+class ColumnarMemoryTest(unittest.TestCase):
+    @staticmethod
+    def traced_size(catalogue_class, books_data):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            catalogue = catalogue_class()
+            Factory(catalogue).create_new_books(books_data)
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+    
+    def test_books_take_a_fraction_of_the_memory_of_book_objects(self):
+        books_data = [book_data(number, author=f"Author {number % 50}") for number in range(3000)]
+        catalogue_size = self.traced_size(Catalogue, books_data)
+        columnar_size = self.traced_size(ColumnarCatalogue, books_data)
+        self.assertLess(columnar_size * 4, catalogue_size)
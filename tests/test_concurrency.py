@@ -0,0 +1,102 @@
+import sys
+import threading
+import unittest
+
+from classes import Catalogue, Factory
+from concurrency import StockUpdateQueue
+from helpers import book_data
+
+def garden_book_data(number):
+    # Every book mentions gardens, so the keyword searches below always have enough matches.
+    return book_data(number, description=f"Description about gardens {number}", stock=number % 50)
+
+class ConcurrentSearchTest(unittest.TestCase):
+    def test_searches_while_another_thread_adds_and_deletes_books(self):
+        catalogue = Catalogue()
+        factory = Factory(catalogue)
+        self.assertEqual(factory.create_new_books([garden_book_data(number) for number in range(500)]), [])
+        stop = threading.Event()
+        
+        def write():
+            number = 500
+            while not stop.is_set():
+                factory.create_new_book(**garden_book_data(number))
+                catalogue.update_stock(number - 400, 1)
+                catalogue.delete_book(number - 450)
+                number += 1
+        
+        # Switching threads as often as possible makes the writer change the indexes in the middle of the searches.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(200):
+                validation_error, books = catalogue.find_books_by_keywords("gardens", 20)
+                self.assertIsNone(validation_error)
+                self.assertEqual(len(books), 20)
+                self.assertIsNone(catalogue.find_books_by_keywords("garden*", 5)[0])
+                validation_error, books = catalogue.iterate_stock_list("ascending_stock")
+                self.assertIsNone(validation_error)
+                book_ids = [book.book_id for book in books]
+                self.assertEqual(len(book_ids), len(set(book_ids)))
+                validation_error, books = catalogue.query_books([("category", "=", "fiction"), ("stock", "<", 10)], "size")
+                self.assertIsNone(validation_error)
+                list(books)
+        finally:
+            stop.set()
+            writer.join()
+            sys.setswitchinterval(switch_interval)
+
+    def test_lookups_by_id_while_another_thread_adds_and_deletes_books(self):
+        catalogue = Catalogue()
+        catalogue.COMPACTION_MIN_TOMBSTONES = 16
+        factory = Factory(catalogue)
+        self.assertEqual(factory.create_new_books([book_data(number) for number in range(100)]), [])
+        stop = threading.Event()
+        
+        def write():
+            number = 100
+            while not stop.is_set():
+                factory.create_new_book(**book_data(number))
+                catalogue.delete_book(number - 50)
+                number += 1
+        
+        # The writer both adds books and compacts the slots while the lookups run.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(10000):
+                for book_id in range(factory.next_book_id - 60, factory.next_book_id + 5):
+                    book = catalogue.get_book(book_id)
+                    if book is not None:
+                        self.assertEqual(book.book_id, book_id)
+        finally:
+            stop.set()
+            writer.join()
+            sys.setswitchinterval(switch_interval)
+
+class StockUpdateQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.assertEqual(Factory(self.catalogue).create_new_books([book_data(4)]), [])
+        self.rejected = []
+        self.queue = StockUpdateQueue(self.catalogue, on_rejected=lambda *rejection: self.rejected.append(rejection))
+        self.addCleanup(self.queue.close)
+    
+    def test_changes_are_applied_one_at_a_time(self):
+        first_sale = self.queue.submit(1, -3)
+        second_sale = self.queue.submit(1, -3)
+        self.assertIsNone(first_sale.result(timeout=5))
+        self.assertIn("Insufficient stock", second_sale.result(timeout=5))
+        self.assertEqual(self.catalogue.get_book(1).stock, 1)
+        self.assertEqual([rejection[:2] for rejection in self.rejected], [(1, -3)])
+    
+    def test_flush_waits_for_all_submitted_changes(self):
+        futures = [self.queue.submit(1, 1) for _ in range(100)] + [self.queue.submit(2, 1)]
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.catalogue.get_book(1).stock, 104)
+        self.assertIn("No book", futures[-1].result())
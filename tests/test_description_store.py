@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from classes import Catalogue, Factory
+from description_store import DescriptionStore
+from helpers import book_data
+
+class DescriptionStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = DescriptionStore(os.path.join(directory, "descriptions"))
+        self.addCleanup(self.store.close)
+        self.catalogue = Catalogue(self.store)
+        self.factory = Factory(self.catalogue)
+        self.assertEqual(self.factory.create_new_books([book_data(number, description=f"Description æøå {number}") for number in range(3)]), [])
+    
+    def test_descriptions_are_read_from_the_store_when_used(self):
+        book = self.catalogue.get_book(2)
+        self.assertIs(type(book._description), int)
+        self.assertEqual(book.description, "Description æøå 1")
+        self.assertEqual(sorted(book.book_id for book in self.catalogue.find_books_by_keywords("æøå")[1]), [1, 2, 3])
+    
+    def test_texts_appended_after_the_file_was_mapped_are_read_directly(self):
+        # Without enough new text to remap the file, the descriptions are read with pread.
+        self.assertEqual(self.catalogue.get_book(1).description, "Description æøå 0")
+        self.assertIsNone(self.store._map)
+        
+        self.store.REMAP_AFTER_BYTES = 0
+        self.assertEqual(self.catalogue.get_book(2).description, "Description æøå 1")
+        mapped_length = len(self.store._map)
+        self.store.REMAP_AFTER_BYTES = 1 << 20
+        self.assertEqual(self.factory.create_new_books([book_data(3, description="Added after mapping")]), [])
+        self.assertEqual(self.catalogue.get_book(4).description, "Added after mapping")
+        self.assertEqual(self.catalogue.get_book(3).description, "Description æøå 2")
+        self.assertEqual(len(self.store._map), mapped_length)
+    
+    def test_deleted_book_keeps_its_description(self):
+        book = self.catalogue.get_book(1)
+        self.catalogue.delete_book(1)
+        self.assertEqual(book._description, "Description æøå 0")
+        self.store.close()
+        self.assertEqual(book.description, "Description æøå 0")
+    
+    def test_changed_description_is_appended(self):
+        old_location = self.catalogue.get_book(1)._description
+        size = self.store._size
+        self.assertIsNone(self.catalogue.update_book(1, description="A new description"))
+        book = self.catalogue.get_book(1)
+        self.assertNotEqual(book._description, old_location)
+        self.assertEqual(book.description, "A new description")
+        self.assertEqual(self.store._size, size + len("A new description"))
+        self.assertEqual(self.store.read(old_location), "Description æøå 0")
@@ -0,0 +1,44 @@
+import unittest
+
+from classes import Catalogue, Factory
+from helpers import book_data
+
+class ValidateBooksDataTest(unittest.TestCase):
+    def test_valid_rows_are_converted(self):
+        valid_books, bad_rows = Factory.validate_books_data([book_data(1, selling_price="19.999", category="FICTION")])
+        self.assertEqual(bad_rows, [])
+        self.assertEqual((valid_books[0]["selling_price"], valid_books[0]["stock"], valid_books[0]["category"]), (20.0, 1, "Fiction"))
+    
+    def test_non_finite_prices_and_negative_counts_are_rejected(self):
+        books_data = [
+            book_data(1, selling_price="nan"),
+            book_data(2, purchase_price="inf"),
+            book_data(3, stock="-1"),
+            book_data(4, size="-100"),
+            book_data(5, selling_price="-infinity", stock="x"),
+            book_data(6, stock="0")
+        ]
+        valid_books, bad_rows = Factory.validate_books_data(books_data)
+        self.assertEqual([data["title"] for data in valid_books], ["Title 6"])
+        self.assertEqual([row_number for row_number, error in bad_rows], [1, 2, 3, 4, 5])
+        self.assertIn("selling_price", bad_rows[0][1])
+        self.assertIn("size", bad_rows[3][1])
+        self.assertIn("stock", bad_rows[4][1])
+    
+    def test_rejected_book_is_not_added(self):
+        catalogue = Catalogue()
+        error = Factory(catalogue).handle_new_book_input(**book_data(1, selling_price="nan"))
+        self.assertIn("selling_price", error)
+        self.assertEqual(catalogue.books, [])
+
+class BookSizeTest(unittest.TestCase):
+    def test_medium_specific_size_follows_updates_of_size(self):
+        catalogue = Catalogue()
+        factory = Factory(catalogue)
+        for number, medium in enumerate(["printed", "e-book", "audiobook"]):
+            self.assertIsNone(factory.handle_new_book_input(**book_data(number, medium=medium)))
+        for book in catalogue.books:
+            self.assertIsNone(catalogue.update_book(book.book_id, size=250))
+        printed_book, ebook, audiobook = catalogue.books
+        self.assertEqual((printed_book.num_pages, ebook.byte_size, audiobook.length_minutes), (250, 250, 250))
+        self.assertIn("250 pages", printed_book.show_book_size())
@@ -0,0 +1,88 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from classes import Book, Catalogue, CatalogueListener, Factory
+from helpers import book_data
+from ingest import load_sync_state, save_sync_state, sync_csv
+
+class ChangeRecorder(CatalogueListener):
+    def __init__(self):
+        self.changes = []
+    
+    def book_added(self, book):
+        self.changes.append(("added", book.book_id))
+    
+    def book_deleted(self, book):
+        self.changes.append(("deleted", book.book_id))
+    
+    def book_updated(self, book, old_values):
+        self.changes.append(("updated", book.book_id, old_values))
+    
+    def stock_updated(self, book, stock_change):
+        self.changes.append(("stock", book.book_id, stock_change))
+
+class SyncCsvTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filepath = os.path.join(self.directory, "feed.csv")
+        self.catalogue = Catalogue()
+        self.factory = Factory(self.catalogue)
+        self.state = {}
+        
+        self.write_feed([book_data(number) for number in range(4)])
+        summary = sync_csv(self.factory, self.filepath, self.state)
+        self.assertEqual((summary["rows"], summary["inserted"], summary["updated"], summary["unchanged"]), (4, 4, 0, 0))
+        # A book added by hand is not part of the feed.
+        self.assertIsNone(self.factory.handle_new_book_input(**book_data(9)))
+        
+        self.recorder = ChangeRecorder()
+        self.catalogue.add_listener(self.recorder)
+        # The second feed has one unchanged row, a new price, a new stock, a removed book and a new book.
+        self.write_feed([book_data(0), book_data(1, selling_price=25.0), book_data(2, stock=7), book_data(4)])
+    
+    def write_feed(self, books_data):
+        with open(self.filepath, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(Book.FIELDS)
+            for data in books_data:
+                writer.writerow([data[field] for field in Book.FIELDS])
+    
+    def stocks_and_prices(self):
+        return {book.title: (book.stock, book.selling_price) for book in self.catalogue.books}
+    
+    def test_only_changed_rows_are_applied(self):
+        summary = sync_csv(self.factory, self.filepath, self.state)
+        self.assertEqual((summary["rows"], summary["inserted"], summary["updated"], summary["unchanged"], summary["removed"]), (4, 1, 2, 1, 0))
+        self.assertEqual((summary["rejected"], summary["bad_rows"]), ([], []))
+        self.assertEqual(self.recorder.changes, [("updated", 2, {"selling_price": 20.0}), ("stock", 3, 5), ("added", 6)])
+        self.assertEqual(self.stocks_and_prices(), {"Title 0": (0, 20.0), "Title 1": (1, 25.0), "Title 2": (7, 20.0), "Title 3": (3, 20.0), "Title 9": (9, 20.0), "Title 4": (4, 20.0)})
+        self.assertEqual(len(self.state), 5)
+        
+        summary = sync_csv(self.factory, self.filepath, self.state)
+        self.assertEqual((summary["inserted"], summary["updated"], summary["unchanged"]), (0, 0, 4))
+    
+    def test_retire_missing_only_deletes_books_from_the_previous_feed(self):
+        summary = sync_csv(self.factory, self.filepath, self.state, retire_missing=True)
+        self.assertEqual(summary["removed"], 1)
+        self.assertIn(("deleted", 4), self.recorder.changes)
+        self.assertEqual(sorted(self.stocks_and_prices()), ["Title 0", "Title 1", "Title 2", "Title 4", "Title 9"])
+        self.assertEqual(len(self.state), 4)
+    
+    def test_unchanged_row_of_a_deleted_book_is_added_again(self):
+        self.catalogue.delete_book(1)
+        summary = sync_csv(self.factory, self.filepath, self.state)
+        self.assertEqual((summary["inserted"], summary["unchanged"]), (2, 0))
+        self.assertIn("Title 0", self.stocks_and_prices())
+
+class SyncStateTest(unittest.TestCase):
+    def test_sync_state_is_saved_to_a_new_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "catalogue_data", "books_data.sync.json")
+        state = {("title", "author", "printed"): 12345}
+        save_sync_state(path, state)
+        self.assertEqual(load_sync_state(path), state)
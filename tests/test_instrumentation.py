@@ -0,0 +1,70 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from classes import Book, Catalogue, Factory
+from helpers import book_data
+from ingest import bulk_ingest, sync_csv
+from instrumentation import Instrumentation
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.factory = Factory(self.catalogue)
+        self.instrumentation = Instrumentation(self.factory, self.catalogue)
+        self.instrumentation.enable()
+        self.addCleanup(self.instrumentation.disable)
+        
+        # Three good rows, two rows failing validation and one row with too few fields.
+        file_descriptor, self.filepath = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, self.filepath)
+        with os.fdopen(file_descriptor, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(Book.FIELDS)
+            for number in range(3):
+                writer.writerow([book_data(number)[field] for field in Book.FIELDS])
+            writer.writerow([{**book_data(3), "stock": "many"}[field] for field in Book.FIELDS])
+            writer.writerow([{**book_data(4), "medium": "scroll"}[field] for field in Book.FIELDS])
+            writer.writerow(["Title 5", "Author 5"])
+    
+    def counters(self):
+        return self.instrumentation.snapshot()["counters"]
+    
+    def test_validation_failures_of_a_csv_sync_are_counted(self):
+        summary = sync_csv(self.factory, self.filepath, {})
+        self.assertEqual(summary["inserted"], 3)
+        self.assertEqual(len(summary["bad_rows"]), 3)
+        self.assertEqual(self.counters()["validation_failures"], 3)
+    
+    def test_validation_failures_of_a_bulk_ingest_are_counted(self):
+        for workers in (1, 2):
+            report = bulk_ingest(self.factory, self.filepath, workers=workers)
+            self.assertEqual(len(report["bad_rows"]), 3)
+        self.assertEqual(self.counters()["validation_failures"], 6)
+    
+    def test_other_factories_are_not_counted(self):
+        other_factory = Factory(Catalogue())
+        bulk_ingest(other_factory, self.filepath, workers=2)
+        sync_csv(other_factory, self.filepath, {})
+        other_factory.create_new_book(**book_data(0))
+        self.assertEqual(self.counters(), {})
+    
+    def test_disabled_instrumentation_counts_nothing(self):
+        self.instrumentation.disable()
+        sync_csv(self.factory, self.filepath, {})
+        self.assertNotIn("validation_failures", self.counters())
+    
+    def test_duplicates_rejected_by_the_factory_are_counted(self):
+        self.assertIsNone(self.factory.create_new_book(**book_data(1)))
+        self.assertIsNotNone(self.factory.create_new_book(**book_data(1)))
+        self.assertEqual(len(self.factory.create_new_books([book_data(1), book_data(2), book_data(2)])), 2)
+        self.assertEqual(self.factory.handle_new_books_input([book_data(2)])["added"], 0)
+        self.assertEqual(self.counters()["duplicates_rejected"], 4)
+    
+    def test_duplicates_within_a_csv_sync_are_counted(self):
+        with open(self.filepath, "a", newline="") as file:
+            csv.writer(file).writerow([book_data(0)[field] for field in Book.FIELDS])
+        summary = sync_csv(self.factory, self.filepath, {})
+        self.assertEqual(len(summary["rejected"]), 1)
+        self.assertEqual(self.counters()["duplicates_rejected"], 1)
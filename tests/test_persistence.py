@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from classes import Catalogue, Factory
+from helpers import book_data
+from persistence import CatalogueStore
+
+class CatalogueStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        catalogue = Catalogue()
+        factory = Factory(catalogue)
+        store = CatalogueStore(self.directory)
+        store.open(catalogue, factory)
+        self.assertEqual(factory.create_new_books([book_data(number, description=f"Description word{number}") for number in range(5)]), [])
+        store.close()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def reopen(self, journal_entries=0):
+        catalogue = Catalogue()
+        factory = Factory(catalogue)
+        self.store = CatalogueStore(self.directory)
+        self.assertEqual(self.store.open(catalogue, factory), {"snapshot_books": 5, "journal_entries": journal_entries})
+        self.addCleanup(self.store.close, False)
+        return catalogue, factory
+    
+    def test_reopened_catalogue_is_fully_indexed(self):
+        catalogue, factory = self.reopen()
+        self.assertEqual(factory.next_book_id, 6)
+        self.assertEqual([book.book_id for book in catalogue.find_books("author", "author 3")[1]], [4])
+        self.assertEqual([book.book_id for book in catalogue.find_books_by_keywords("word2")[1]], [3])
+        self.assertEqual(catalogue.lowest_stock(1)[0].book_id, 1)
+        self.assertIsNotNone(factory.create_new_book(**book_data(1)))
+    
+    def test_book_deleted_before_the_first_keyword_search_is_not_found(self):
+        catalogue, factory = self.reopen()
+        catalogue.delete_book(3)
+        catalogue.update_book(4, description="Description changed")
+        self.assertEqual(catalogue.find_books_by_keywords("word2")[1], [])
+        self.assertEqual(catalogue.find_books_by_keywords("word3")[1], [])
+        self.assertEqual([book.book_id for book in catalogue.find_books_by_keywords("changed")[1]], [4])
+    
+    def test_basket_sale_is_journaled_as_one_entry(self):
+        catalogue, factory = self.reopen()
+        self.assertIsNone(catalogue.update_stocks({2: -1, 3: -2, 4: -3}))
+        self.store.close(checkpoint=False)
+        with open(self.store.journal_path, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 1)
+        
+        catalogue, factory = self.reopen(journal_entries=1)
+        self.assertEqual([book.stock for book in catalogue.books], [0, 0, 0, 0, 4])
+    
+    def test_half_written_basket_sale_is_not_replayed(self):
+        catalogue, factory = self.reopen()
+        self.assertIsNone(catalogue.update_stocks({2: -1, 3: -2}))
+        self.store.close(checkpoint=False)
+        with open(self.store.journal_path, "r+b") as file:
+            file.truncate(os.path.getsize(self.store.journal_path) - 5)
+        
+        catalogue, factory = self.reopen()
+        self.assertEqual([book.stock for book in catalogue.books], [0, 1, 2, 3, 4])
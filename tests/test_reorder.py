@@ -0,0 +1,56 @@
+import unittest
+
+from classes import Catalogue, Factory
+from helpers import book_data
+from reorder import ReorderMonitor
+
+class ReorderMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        report = Factory(self.catalogue).handle_new_books_input([
+            book_data(1, stock=6),
+            book_data(2, stock=6, category="non-fiction"),
+            book_data(3, stock=6, medium="audiobook"),
+            book_data(4, stock=12)
+        ])
+        self.assertEqual(report["added"], 4)
+        self.monitor = ReorderMonitor(self.catalogue)
+        self.addCleanup(self.monitor.close)
+        self.alerts = []
+        self.monitor.subscribe(lambda book, reorder_point: self.alerts.append((book.book_id, reorder_point)))
+    
+    def test_callback_fires_once_when_stock_drops_below_the_reorder_point(self):
+        self.assertIsNone(self.catalogue.update_stock(1, -1))
+        self.assertEqual(self.alerts, [])
+        self.assertIsNone(self.catalogue.update_stock(1, -2))
+        self.assertIsNone(self.catalogue.update_stock(1, -1))
+        self.assertEqual(self.alerts, [(1, 5)])
+        
+        self.assertIsNone(self.catalogue.update_stock(1, 10))
+        self.assertIsNone(self.catalogue.update_book(1, stock=0))
+        self.assertEqual(self.alerts, [(1, 5), (1, 5)])
+    
+    def test_callbacks_can_be_limited_to_a_category_and_medium(self):
+        non_fiction_alerts = []
+        audiobook_alerts = []
+        self.monitor.subscribe(lambda book, reorder_point: non_fiction_alerts.append(book.book_id), category="Non-fiction")
+        self.monitor.subscribe(lambda book, reorder_point: audiobook_alerts.append(book.book_id), category="fiction", medium="audiobook")
+        self.assertIsNone(self.catalogue.update_stocks({1: -3, 2: -3, 3: -3}))
+        self.assertEqual(sorted(self.alerts), [(1, 5), (2, 5), (3, 5)])
+        self.assertEqual((non_fiction_alerts, audiobook_alerts), ([2], [3]))
+    
+    def test_reorder_points_set_for_a_book_override_the_default(self):
+        self.monitor.set_reorder_point(4, 10)
+        self.assertIsNone(self.catalogue.update_stock(4, -3))
+        self.assertIsNone(self.catalogue.update_stock(1, -1))
+        self.assertEqual(self.alerts, [(4, 10)])
+        self.assertEqual([book.book_id for book in self.monitor.books_to_reorder()], [4])
+        self.assertEqual(self.monitor.get_reorder_point(1), 5)
+    
+    def test_lowest_stock_and_books_to_reorder_within_a_category(self):
+        self.assertIsNone(self.catalogue.update_stocks({2: -4, 3: -2}))
+        self.assertEqual([book.book_id for book in self.monitor.books_to_reorder()], [2, 3])
+        self.assertEqual([book.book_id for book in self.monitor.books_to_reorder(category="non-fiction")], [2])
+        self.assertEqual([book.book_id for book in self.monitor.lowest_stock(2, medium="printed")], [2, 1])
+        self.catalogue.delete_book(2)
+        self.assertEqual([book.book_id for book in self.monitor.books_to_reorder()], [3])
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import unittest
+
+from classes import Catalogue, Factory
+from helpers import book_data
+from service import CatalogueService
+
+class CatalogueServiceTest(unittest.TestCase):
+    def setUp(self):
+        catalogue = Catalogue()
+        factory = Factory(catalogue)
+        self.assertEqual(factory.create_new_books([book_data(number) for number in range(3)]), [])
+        self.service = CatalogueService(factory, catalogue)
+    
+    def test_malformed_requests_get_error_responses(self):
+        malformed_requests = [
+            {"operation": "adjust_stock", "book_id": 1, "stock_change": "abc"},
+            {"operation": "adjust_stock", "stock_changes": [[1, 2]]},
+            {"operation": "query", "predicates": [("stock", "<", 5)], "limit": "5"},
+            {"operation": "query", "predicates": [("stock", "<", 5)], "limit": -1},
+            {"operation": "add", "book": None}
+        ]
+        for request in malformed_requests:
+            response = self.service.handle_request({**request, "id": 7})
+            self.assertFalse(response["ok"], request)
+            self.assertTrue(response["error"], request)
+            self.assertEqual(response["id"], 7)
+    
+    def test_bulk_add_reports_invalid_rows_and_duplicates(self):
+        books = [book_data(3), book_data(4, stock="many"), book_data(0), book_data(5, medium="scroll")]
+        response = self.service.handle_request({"operation": "bulk_add", "books": books})
+        self.assertFalse(response["ok"])
+        self.assertEqual(response["added"], 1)
+        self.assertEqual([error["index"] for error in response["errors"]], [1, 3])
+        self.assertEqual(len(response["rejected"]), 1)
+        self.assertEqual(len(self.service.catalogue.books), 4)
+    
+    def test_connection_survives_bad_requests(self):
+        requests = [
+            {"operation": "adjust_stock", "book_id": 1, "stock_change": "abc"},
+            {"operation": "stock_report", "sorting_choice": "ascending_stock", "offset": "abc"},
+            {"operation": "stock_report", "sorting_choice": "ascending_stock", "id": 2}
+        ]
+        
+        async def run():
+            server = await asyncio.start_server(self.service.handle_connection, "127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write("".join(json.dumps(request) + "\n" for request in requests).encode("utf-8"))
+                await writer.drain()
+                lines = [json.loads(await reader.readline()) for _ in range(4)]
+                writer.close()
+                return lines
+        
+        lines = asyncio.run(run())
+        self.assertFalse(lines[0]["ok"])
+        self.assertFalse(lines[1]["ok"])
+        self.assertEqual([book["book_id"] for book in lines[2]["books"]], [1, 2, 3])
+        self.assertEqual((lines[3]["done"], lines[3]["count"], lines[3]["id"]), (True, 3, 2))
@@ -0,0 +1,41 @@
+import unittest
+
+from classes import Factory
+from helpers import book_data
+from sharding import ShardedCatalogue
+
+class ShardedCatalogueTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalogue = ShardedCatalogue(shard_count=2, block_size=2)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.catalogue.close()
+    
+    def setUp(self):
+        self.catalogue.delete_books([book.book_id for book in self.catalogue.books])
+        self.factory = Factory(self.catalogue)
+        self.assertEqual(self.factory.create_new_books([book_data(number, stock=number + 5) for number in range(6)]), [])
+    
+    def test_stock_updates_on_returned_books_reach_the_shards(self):
+        self.catalogue.get_book(3).update_stock(-2)
+        self.catalogue.find_books("author", "author 4")[1][0].update_stock(-2)
+        self.catalogue.lowest_stock(1)[0].update_stock(1)
+        self.assertEqual({book.book_id: book.stock for book in self.catalogue.books}, {1: 6, 2: 6, 3: 5, 4: 8, 5: 7, 6: 10})
+    
+    def test_rejected_stock_update_on_a_returned_book_changes_nothing(self):
+        book = self.catalogue.get_book(5)
+        self.assertIn("Insufficient stock", book.update_stock(-100))
+        self.assertEqual(self.catalogue.get_book(5).stock, 9)
+    
+    def test_deleted_books_are_detached(self):
+        book_id = self.catalogue.books[0].book_id
+        self.catalogue.delete_book(book_id)
+        self.assertIsNone(self.catalogue.get_book(book_id))
+    
+    def test_invalid_query_limit_is_rejected(self):
+        for limit in ("5", -1):
+            validation_error, books = self.catalogue.query_books([("stock", "<", 10)], "size", limit)
+            self.assertIn("Invalid limit", validation_error)
+            self.assertEqual(list(books), [])
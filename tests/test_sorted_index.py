@@ -0,0 +1,80 @@
+import unittest
+
+from classes import Catalogue, Factory, SortedIndex
+from helpers import book_data
+
+class SortedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.factory = Factory(self.catalogue)
+        self.assertEqual(self.factory.create_new_books([book_data(number) for number in range(10)]), [])
+    
+    def test_stock_update_during_iteration_does_not_repeat_books(self):
+        validation_error, books = self.catalogue.iterate_stock_list("ascending_stock")
+        self.assertIsNone(validation_error)
+        seen = []
+        for book in books:
+            seen.append(book.book_id)
+            if len(seen) == 1:
+                self.catalogue.update_stock(book.book_id, 100)
+        self.assertEqual(seen, list(range(1, 11)))
+    
+    def test_delete_during_iteration_does_not_fail(self):
+        validation_error, books = self.catalogue.iterate_stock_list("ascending_stock", 2, 5)
+        self.assertIsNone(validation_error)
+        seen = []
+        for book in books:
+            seen.append(book.book_id)
+            self.catalogue.delete_book(10)
+        self.assertEqual(seen, [3, 4, 5, 6, 7])
+        self.assertEqual([book.book_id for book in self.catalogue.iterate_stock_list("ascending_stock", 7)[1]], [8, 9])
+
+class Entry:
+    def __init__(self, book_id, key):
+        self.book_id = book_id
+        self.key = key
+
+class BlockedSortedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SortedIndex(lambda book: book.key)
+        self.index.BLOCK_SIZE = 4
+        self.books = {}
+    
+    def add(self, book_id, key):
+        self.books[book_id] = Entry(book_id, key)
+        self.index.add(self.books[book_id])
+    
+    def expected(self):
+        return sorted(self.books.values(), key=lambda book: (book.key, book.book_id))
+    
+    def test_blocks_are_split_and_merged_as_books_come_and_go(self):
+        for book_id in range(1, 101):
+            self.add(book_id, (book_id * 37) % 11)
+        self.assertGreater(len(self.index._blocks), 10)
+        self.assertEqual(list(self.index.iterate()), self.expected())
+        
+        for book_id in range(1, 101, 3):
+            self.index.remove(self.books.pop(book_id))
+        for book_id in range(2, 101, 3):
+            book = self.books[book_id]
+            self.index.remove(book)
+            book.key = -book.key
+            self.index.add(book)
+        expected = self.expected()
+        self.assertEqual(len(self.index), len(expected))
+        self.assertEqual(list(self.index.iterate()), expected)
+        self.assertEqual(list(self.index.iterate(17, 9)), expected[17:26])
+        self.assertTrue(all(0 < len(block) <= 8 for block in self.index._blocks))
+        
+        start, stop = self.index.range_positions(-5, 3, include_low=False)
+        self.assertEqual(expected[start:stop], [book for book in expected if -5 < book.key <= 3])
+    
+    def test_add_many_merges_with_existing_entries(self):
+        for book_id in range(1, 40):
+            self.add(book_id, book_id % 7)
+        new_books = [Entry(book_id, book_id % 5) for book_id in range(40, 80)]
+        self.books.update((book.book_id, book) for book in new_books)
+        self.index.add_many(new_books)
+        self.assertEqual(list(self.index.iterate()), self.expected())
+        self.index.add_many([Entry(80, 2)])
+        self.assertEqual(len(self.index), 80)
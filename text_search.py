@@ -0,0 +1,93 @@
+import math
+import re
+from bisect import bisect_left
+from heapq import nlargest
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_TOKEN_PATTERN = re.compile(r"\w+\*?")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class InvertedIndex:
+    '''
+    This class is a full-text index, which maps every word to the books it occurs in and how many times. Searches are ranked with the BM25 formula, so books where the query words are frequent, and where rare query words occur, are ranked highest. A query word ending with `*` matches every word starting with it.
+    
+    The index is updated one book at a time. The sorted list of words used for prefix searches is only rebuilt when a prefix search needs it, so adding many books in a row stays cheap.
+    '''
+    
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self):
+        self._postings = {}
+        self._document_lengths = {}
+        self._total_length = 0
+        self._sorted_terms = []
+        self._sorted_terms_stale = False
+    
+    def __len__(self):
+        return len(self._document_lengths)
+    
+    def add_document(self, document_id, text):
+        terms = tokenize(text)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._sorted_terms_stale = True
+            postings[document_id] = postings.get(document_id, 0) + 1
+        self._document_lengths[document_id] = len(terms)
+        self._total_length += len(terms)
+    
+    def remove_document(self, document_id, text):
+        '''
+        Removes a document from the index. The text must be the same as when the document was added, since it is used to find the words to remove the document from.
+        '''
+        
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(document_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms_stale = True
+        self._total_length -= self._document_lengths.pop(document_id, 0)
+    
+    def _expand_term(self, term):
+        if not term.endswith("*"):
+            return [term] if term in self._postings else []
+        
+        prefix = term[:-1]
+        if self._sorted_terms_stale:
+            self._sorted_terms = sorted(self._postings)
+            self._sorted_terms_stale = False
+        position = bisect_left(self._sorted_terms, prefix)
+        expanded_terms = []
+        while position < len(self._sorted_terms) and self._sorted_terms[position].startswith(prefix):
+            expanded_terms.append(self._sorted_terms[position])
+            position += 1
+        return expanded_terms
+    
+    def search(self, query, limit=10):
+        '''
+        Returns up to `limit` tuples of (document ID, score) for the documents best matching the query, highest score first.
+        '''
+        
+        query_terms = QUERY_TOKEN_PATTERN.findall(str(query).lower())
+        if not query_terms or not self._document_lengths:
+            return []
+        
+        document_count = len(self._document_lengths)
+        average_length = self._total_length / document_count or 1
+        scores = {}
+        for query_term in query_terms:
+            for term in self._expand_term(query_term):
+                postings = self._postings[term]
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for document_id, frequency in postings.items():
+                    length_norm = 1 - self.B + self.B * self._document_lengths[document_id] / average_length
+                    scores[document_id] = scores.get(document_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + self.K1 * length_norm)
+        
+        return nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))